@@ -0,0 +1,54 @@
+"""add sync_state table and tournament start_at
+
+Revision ID: 4c1f0a9d2e7b
+Revises: cf7cb93a17d5
+Create Date: 2026-10-18 10:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1f0a9d2e7b'
+down_revision: Union[str, Sequence[str], None] = 'cf7cb93a17d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sync_state',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('country_code', sa.Text(), nullable=True),
+        sa.Column('addr_state', sa.Text(), nullable=True),
+        sa.Column(
+            'last_start_at',
+            sa.DateTime(timezone=True),
+            nullable=True),
+        sa.Column(
+            'updated_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('NOW()'),
+            nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        op.f('ix_sync_state_id'), 'sync_state', ['id'], unique=False
+    )
+    op.add_column(
+        'tournament',
+        sa.Column(
+            'start_at',
+            sa.DateTime(timezone=True),
+            nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tournament', 'start_at')
+    op.drop_index(op.f('ix_sync_state_id'), table_name='sync_state')
+    op.drop_table('sync_state')
@@ -0,0 +1,30 @@
+"""add event import_error
+
+Revision ID: 9e2b6d41a8c3
+Revises: 4c1f0a9d2e7b
+Create Date: 2026-10-18 11:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '9e2b6d41a8c3'
+down_revision: Union[str, Sequence[str], None] = '4c1f0a9d2e7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'event',
+        sa.Column('import_error', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('event', 'import_error')
@@ -0,0 +1,34 @@
+"""add event sets checkpoint
+
+Revision ID: b7d3e5f10c62
+Revises: 9e2b6d41a8c3
+Create Date: 2026-10-18 12:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e5f10c62'
+down_revision: Union[str, Sequence[str], None] = '9e2b6d41a8c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'event',
+        sa.Column('sets_checkpoint_offset', sa.Integer(), nullable=True))
+    op.add_column(
+        'event',
+        sa.Column('sets_checkpoint_total', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('event', 'sets_checkpoint_total')
+    op.drop_column('event', 'sets_checkpoint_offset')
@@ -0,0 +1,77 @@
+"""add import_job table
+
+Revision ID: 3f8a1c6e9d24
+Revises: b7d3e5f10c62
+Create Date: 2026-10-18 13:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8a1c6e9d24'
+down_revision: Union[str, Sequence[str], None] = 'b7d3e5f10c62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'import_job',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'status',
+            sa.Enum(
+                'PENDING',
+                'RUNNING',
+                'DONE',
+                'FAILED',
+                name='importjobstatus'),
+            nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('worker_id', sa.Text(), nullable=True),
+        sa.Column(
+            'leased_until',
+            sa.DateTime(timezone=True),
+            nullable=True),
+        sa.Column(
+            'created_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('NOW()'),
+            nullable=False),
+        sa.Column(
+            'updated_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('NOW()'),
+            nullable=False),
+        sa.ForeignKeyConstraint(
+            ['event_id'], ['event.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('event_id')
+    )
+    op.create_index(
+        op.f('ix_import_job_id'), 'import_job', ['id'], unique=False
+    )
+    op.create_index(
+        op.f('ix_import_job_status'), 'import_job', ['status'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_import_job_status'), table_name='import_job')
+    op.drop_index(op.f('ix_import_job_id'), table_name='import_job')
+    op.drop_table('import_job')
+    sa.Enum(
+        'PENDING',
+        'RUNNING',
+        'DONE',
+        'FAILED',
+        name='importjobstatus'
+    ).drop(op.get_bind())
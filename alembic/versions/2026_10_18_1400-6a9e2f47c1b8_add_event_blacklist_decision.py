@@ -0,0 +1,34 @@
+"""add event blacklist decision
+
+Revision ID: 6a9e2f47c1b8
+Revises: 3f8a1c6e9d24
+Create Date: 2026-10-18 14:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '6a9e2f47c1b8'
+down_revision: Union[str, Sequence[str], None] = '3f8a1c6e9d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'event',
+        sa.Column('blacklisted', sa.Boolean(), nullable=True))
+    op.add_column(
+        'event',
+        sa.Column('blacklist_pattern', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('event', 'blacklist_pattern')
+    op.drop_column('event', 'blacklisted')
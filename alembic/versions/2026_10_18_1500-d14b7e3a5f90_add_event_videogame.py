@@ -0,0 +1,42 @@
+"""add event videogame_id and sync_state videogame_ids
+
+Revision ID: d14b7e3a5f90
+Revises: 6a9e2f47c1b8
+Create Date: 2026-10-18 15:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd14b7e3a5f90'
+down_revision: Union[str, Sequence[str], None] = '6a9e2f47c1b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'event',
+        sa.Column('videogame_id', sa.Integer(), nullable=True))
+    op.create_index(
+        op.f('ix_event_videogame_id'), 'event', ['videogame_id'], unique=False
+    )
+    op.add_column(
+        'sync_state',
+        sa.Column('videogame_ids', sa.Text(), nullable=True))
+
+    # Everything imported so far was Super Smash Bros. Ultimate
+    op.execute("UPDATE event SET videogame_id = 1386")
+    op.execute("UPDATE sync_state SET videogame_ids = '1386'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sync_state', 'videogame_ids')
+    op.drop_index(op.f('ix_event_videogame_id'), table_name='event')
+    op.drop_column('event', 'videogame_id')
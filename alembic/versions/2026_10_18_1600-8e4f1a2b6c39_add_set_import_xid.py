@@ -0,0 +1,43 @@
+"""add set import_xid
+
+Revision ID: 8e4f1a2b6c39
+Revises: d14b7e3a5f90
+Create Date: 2026-10-18 16:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4f1a2b6c39'
+down_revision: Union[str, Sequence[str], None] = 'd14b7e3a5f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing sets get 0, a constant default does not rewrite the table
+    op.add_column(
+        'set',
+        sa.Column(
+            'import_xid',
+            sa.BigInteger(),
+            server_default='0',
+            nullable=False))
+    op.alter_column(
+        'set',
+        'import_xid',
+        server_default=sa.text('(pg_current_xact_id()::text::bigint)'))
+    op.create_index(
+        op.f('ix_set_import_xid'), 'set', ['import_xid'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_set_import_xid'), table_name='set')
+    op.drop_column('set', 'import_xid')
@@ -0,0 +1,287 @@
+import argparse
+import enum
+import io
+from datetime import datetime
+from typing import Any, Dict, Generator, Iterable, List, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from main import (configure_event_blacklist, configure_metrics,
+                  configure_startgg_client, fetch_events_sets_pages_iter,
+                  get_args_parser, get_sets_rows, load_database,
+                  load_signal_handler)
+from models import EventDB, TournamentDB
+from queries.errors import StartggRequestError
+from queries.sets.getSets import EventSetsPage
+from queries.tournaments.getTournaments import get_tournaments_iter
+from utils.constants import STARTGG_BASE_URL
+from utils.shouldSkipEvent import should_skip_event
+
+# Tables in foreign key order, with the columns written by the loader
+COPY_TABLES: Dict[str, List[str]] = {
+    'tournament': [
+        'id', 'name', 'url', 'city', 'country_code', 'addr_state', 'start_at',
+        'imported',
+    ],
+    'event': [
+        'id', 'name', 'num_entrants', 'slug', 'start_at', 'state',
+        'tournament_id', 'imported', 'import_error', 'blacklisted',
+        'blacklist_pattern', 'videogame_id',
+    ],
+    'player': ['id', 'gamer_tag'],
+    'team': ['id'],
+    'team_player': ['team_id', 'player_id'],
+    'set': [
+        'id', 'winner_seed', 'loser_seed', 'winner_score', 'loser_score',
+        'winner_team_id', 'loser_team_id', 'event_id',
+    ],
+}
+
+# Existing rows are kept, only their import status can change
+MERGE_CONFLICT_CLAUSES: Dict[str, str] = {
+    'tournament': 'ON CONFLICT (id) DO UPDATE SET imported = '
+                  'EXCLUDED.imported',
+    'event': 'ON CONFLICT (id) DO UPDATE SET imported = '
+             '"event".imported OR EXCLUDED.imported, '
+             'import_error = EXCLUDED.import_error',
+}
+
+
+def format_copy_value(value: Any) -> str:
+    """Formats a value for COPY ... FROM STDIN text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.name
+
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class CopyBuffers:
+    """Normalized rows waiting to be copied, de-duplicated by primary key"""
+
+    def __init__(self):
+        self.rows: Dict[str, Dict[Any, Tuple]] = {
+            table: {} for table in COPY_TABLES
+        }
+
+    @property
+    def set_count(self) -> int:
+        return len(self.rows['set'])
+
+    def add(self, table: str, row: Dict[str, Any], key: Any):
+        self.rows[table][key] = tuple(
+            row[column] for column in COPY_TABLES[table]
+        )
+
+    def add_tournament(self, tournament: TournamentDB):
+        self.add('tournament', {
+            'id': tournament.id,
+            'name': tournament.name,
+            'url': tournament.url,
+            'city': tournament.city,
+            'country_code': tournament.country_code,
+            'addr_state': tournament.addr_state,
+            'start_at': tournament.start_at,
+            'imported': tournament.imported,
+        }, tournament.id)
+
+        for event in tournament.events:
+            self.add('event', {
+                'id': event.id,
+                'name': event.name,
+                'num_entrants': event.num_entrants,
+                'slug': event.slug,
+                'start_at': event.start_at,
+                'state': event.state,
+                'tournament_id': tournament.id,
+                'imported': event.imported,
+                'import_error': event.import_error,
+                'blacklisted': event.blacklisted,
+                'blacklist_pattern': event.blacklist_pattern,
+                'videogame_id': event.videogame_id,
+            }, event.id)
+
+    def add_sets_rows(self, event: EventDB, event_sets_pages: Iterable[EventSetsPage]):
+        for page in event_sets_pages:
+            rows = get_sets_rows(page.sets, event.id)
+
+            for player_id, row in rows['players'].items():
+                self.add('player', row, player_id)
+            for team_id, row in rows['teams'].items():
+                self.add('team', row, team_id)
+            for team_id, player_id in rows['team_players']:
+                self.add('team_player', {
+                    'team_id': team_id,
+                    'player_id': player_id,
+                }, (team_id, player_id))
+            for set_id, row in rows['sets'].items():
+                self.add('set', row, set_id)
+
+    def flush(self, session: Session):
+        """Copies every buffered row into staging tables then merges them
+        into the real tables, in foreign key order"""
+        cursor = session.connection().connection.cursor()
+
+        for table, columns in COPY_TABLES.items():
+            rows = self.rows[table]
+            if not rows:
+                continue
+
+            staging_table = f"staging_{table}"
+            column_list = ', '.join(columns)
+
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS {staging_table} '
+                f'(LIKE "{table}" INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+            )
+
+            buffer = io.StringIO()
+            for row in rows.values():
+                buffer.write('\t'.join(format_copy_value(v) for v in row))
+                buffer.write('\n')
+            buffer.seek(0)
+
+            cursor.copy_expert(
+                f"COPY {staging_table} ({column_list}) FROM STDIN",
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO "{table}" ({column_list}) '
+                f'SELECT {column_list} FROM {staging_table} '
+                f'{MERGE_CONFLICT_CLAUSES.get(table, "ON CONFLICT DO NOTHING")}'
+            )
+            print(f"> Copied {len(rows)} rows into {table}")
+
+        session.commit()
+        self.rows = {table: {} for table in COPY_TABLES}
+
+
+def get_backfill_events_iter(
+    tournaments: Iterable[TournamentDB],
+    imported_tournament_ids: Set[int],
+    buffers: CopyBuffers,
+    session: Session,
+) -> Generator[EventDB, None, None]:
+    for tournament in tournaments:
+        if tournament.id in imported_tournament_ids:
+            # Only the listed events not saved yet, like those of a game
+            # newly passed to `--videogame`, are backfilled
+            saved_event_ids = set(session.scalars(
+                select(EventDB.id).where(EventDB.tournament_id == tournament.id)
+            ))
+            tournament.events = [
+                event for event in tournament.events
+                if event.id not in saved_event_ids
+            ]
+            if not tournament.events:
+                continue
+
+        pending_events = [
+            event for event in tournament.events
+            if not should_skip_event(event)
+        ]
+
+        if not pending_events:
+            tournament.imported = True
+            buffers.add_tournament(tournament)
+            continue
+
+        yield from pending_events
+
+
+def main(session: Session, args: argparse.Namespace):
+    configure_startgg_client(args)
+    configure_event_blacklist(args)
+    configure_metrics(args)
+    tournaments = get_tournaments_iter({
+        'afterDate': args.startDate,
+        'beforeDate': args.endDate,
+        'countryCode': args.countryCode,
+        'addrState': args.addrState,
+        'minEntrants': args.minEntrants,
+        'videogameIds': args.videogame,
+    }, args.discoveryConcurrency)
+
+    imported_tournament_ids = set(session.scalars(
+        select(TournamentDB.id).where(TournamentDB.imported.is_(True))
+    ))
+    buffers = CopyBuffers()
+
+    events = get_backfill_events_iter(
+        tournaments, imported_tournament_ids, buffers, session
+    )
+
+    for event, event_sets_pages in fetch_events_sets_pages_iter(
+        events,
+        args.concurrency,
+        session if args.prepass else None,
+        args.batchEvents,
+    ):
+        print(f"EVENT [{event.id}] : {STARTGG_BASE_URL}/{event.slug}")
+        try:
+            buffers.add_sets_rows(event, event_sets_pages)
+            event.imported = True
+        except StartggRequestError as e:
+            print(f"> Skipping EVENT [{event.id}] : {e}")
+            event.import_error = f"{type(e).__name__}: {e}"
+
+        # Tournament rows are buffered once all their events are fetched, so
+        # a flush never copies sets whose event row is missing
+        tournament = event.tournament
+        if all(
+            should_skip_event(tournament_event) or
+            tournament_event.imported or
+            tournament_event.import_error is not None
+            for tournament_event in tournament.events
+        ):
+            tournament.imported = all(
+                tournament_event.import_error is None
+                for tournament_event in tournament.events
+            )
+            buffers.add_tournament(tournament)
+
+            if buffers.set_count >= args.flushSize:
+                buffers.flush(session)
+
+    buffers.flush(session)
+
+
+def load_args() -> argparse.Namespace:
+    parser = get_args_parser(
+        'Backfills sets from start.gg into a postgres database using COPY'
+    )
+
+    parser.add_argument(
+        '--flushSize',
+        action='store',
+        default=20000,
+        type=int,
+        help='Number of buffered sets copied into the database at once (default: 20000)'
+    )
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    args = load_args()
+    load_dotenv()
+    session = load_database()
+    load_signal_handler(session)
+
+    main(session, args)
+
+    session.close()
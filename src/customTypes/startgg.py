@@ -33,6 +33,7 @@ class Tournament(TypedDict):
     city: str
     countryCode: str
     addrState: str
+    startAt: int
     events: list["Event"]
 
 
@@ -43,6 +44,11 @@ class Event(TypedDict):
     slug: str
     startAt: int
     state: ActivityState
+    videogame: "Videogame"
+
+
+class Videogame(TypedDict):
+    id: int
 
 
 # region SuccessEventSetsResponse
@@ -104,6 +110,31 @@ class Score(TypedDict):
     """'-1' is DQ, the opponent of a DQ has None"""
 
 
+# region SuccessEventSetIdsResponse
+
+
+class SuccessEventSetIdsResponse(TypedDict):
+    data: "DataEventSetIdsObject"
+    extensions: "ExtensionObject"
+
+
+class DataEventSetIdsObject(TypedDict):
+    event: "EventSetIdsEventObject"
+
+
+class EventSetIdsEventObject(TypedDict):
+    sets: "EventSetIdsObject"
+
+
+class EventSetIdsObject(TypedDict):
+    pageInfo: "PageInfoObject"
+    nodes: list["EventSetId"]
+
+
+class EventSetId(TypedDict):
+    id: int
+
+
 class ExtensionObject(TypedDict):
     queryComplexity: int
 
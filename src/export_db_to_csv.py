@@ -1,26 +1,39 @@
 import argparse
 import csv
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
+from typing import Generator, Iterable, List, Sequence
 
 from dotenv import load_dotenv
-from sqlalchemy import DATE, cast, select
-from sqlalchemy.orm import joinedload, raiseload
+from sqlalchemy import (DATE, BigInteger, ColumnElement, Row, Select, Text, cast,
+                        func, select, true, union)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import Session
 
 from main import load_database
-from models import EventDB, SetDB, TeamDB, TournamentDB
+from models import EventDB, PlayerDB, SetDB, TournamentDB, team_player
+from utils.constants import STARTGG_ULTIMATE_VIDEOGAME_ID
+from utils.datePartitions import get_date_partitions
+from utils.exportWatermark import load_watermark, save_watermark
 from utils.getDateTimestamp import get_date_timestamp
 from utils.parse_str_or_none import parse_str_or_none
 
+YIELD_PER = 1000
 
-def fetch_sets(args: argparse.Namespace):
-    load_dotenv()
-    session = load_database()
+FILE_EXTENSIONS = {
+    'csv': 'csv',
+    'parquet': 'parquet',
+    'arrow': 'arrow',
+}
 
+
+def filter_sets_stmt(stmt: Select, args: argparse.Namespace) -> Select:
     stmt = (
-        select(SetDB)
-        .order_by(SetDB.id)
-        .join(EventDB)
-        .join(TournamentDB)
+        stmt
+        .join(EventDB, SetDB.event_id == EventDB.id)
+        .join(TournamentDB, EventDB.tournament_id == TournamentDB.id)
         .where(
             cast(EventDB.start_at, DATE) >= datetime.fromtimestamp(
                 args.startDate,
@@ -31,44 +44,153 @@ def fetch_sets(args: argparse.Namespace):
                 tz=timezone.utc
             ),
         )
-        .options(
-            joinedload(SetDB.event).joinedload(EventDB.tournament),
-            joinedload(SetDB.winner_team).joinedload(TeamDB.players),
-            joinedload(SetDB.loser_team).joinedload(TeamDB.players),
-            raiseload("*")
-        )
     )
 
     if args.countryCode:
         stmt = stmt.where(TournamentDB.country_code == args.countryCode)
     if args.addrState:
         stmt = stmt.where(TournamentDB.addr_state == args.addrState)
+    if args.videogame:
+        stmt = stmt.where(EventDB.videogame_id.in_(args.videogame))
+    if args.afterSetId is not None:
+        stmt = stmt.where(SetDB.id > args.afterSetId)
+    if args.afterImportXid is not None:
+        stmt = stmt.where(SetDB.import_xid >= args.afterImportXid)
+    if args.beforeImportXid is not None:
+        stmt = stmt.where(SetDB.import_xid < args.beforeImportXid)
 
-    fetch_time_start = datetime.now()
-    sets = session.scalars(stmt).unique().all()
-    fetch_time_end = datetime.now()
-    delta_time = fetch_time_end - fetch_time_start
+    return stmt
 
-    session.close()
 
-    print(f"> Fetched {len(sets)} sets, delta time: {delta_time}")
-    return sets
+def fetch_max_players_count(session: Session, stmt: Select) -> int:
+    """Largest team among the sets selected by `stmt`, a filtered select
+    from SetDB"""
+    team_ids = union(
+        stmt.with_only_columns(SetDB.winner_team_id.label('team_id')),
+        stmt.with_only_columns(SetDB.loser_team_id.label('team_id')),
+    ).subquery()
 
+    players_counts = (
+        select(func.count().label('players_count'))
+        .select_from(team_player)
+        .where(team_player.c.team_id.in_(select(team_ids.c.team_id)))
+        .group_by(team_player.c.team_id)
+        .subquery()
+    )
 
-def main(args: argparse.Namespace):
-    sets = fetch_sets(args)
+    return session.scalar(
+        select(func.coalesce(func.max(players_counts.c.players_count), 0))
+    )
 
-    now_timestamp = datetime.now().timestamp()
-    output_filename = f"{now_timestamp}-{args.outSuffix}.csv" if args.outSuffix else f"{now_timestamp}.csv"
-    output_path = f"output/{output_filename}"
 
-    max_players_count = max([
-        max(
-            len(set_db.winner_team.players),
-            len(set_db.loser_team.players),
-        ) for set_db in sets
-    ])
+def get_team_players_lateral(team_id: ColumnElement, name: str):
+    return (
+        select(
+            func.array_agg(
+                aggregate_order_by(PlayerDB.id, PlayerDB.id)
+            ).label('player_ids'),
+            func.array_agg(
+                aggregate_order_by(PlayerDB.gamer_tag, PlayerDB.id)
+            ).label('gamer_tags'),
+        )
+        .select_from(team_player.join(PlayerDB))
+        .where(team_player.c.team_id == team_id)
+        .lateral(name)
+    )
+
+
+def get_sets_stmt(args: argparse.Namespace) -> Select:
+    winner_players = get_team_players_lateral(
+        SetDB.winner_team_id, 'winner_players'
+    )
+    loser_players = get_team_players_lateral(
+        SetDB.loser_team_id, 'loser_players'
+    )
+
+    stmt = select(
+        SetDB.id,
+        EventDB.start_at,
+        TournamentDB.id.label('tournament_id'),
+        TournamentDB.name.label('tournament_name'),
+        EventDB.id.label('event_id'),
+        EventDB.name.label('event_name'),
+        EventDB.num_entrants,
+        winner_players.c.player_ids.label('winner_player_ids'),
+        winner_players.c.gamer_tags.label('winner_gamer_tags'),
+        loser_players.c.player_ids.label('loser_player_ids'),
+        loser_players.c.gamer_tags.label('loser_gamer_tags'),
+        SetDB.winner_seed,
+        SetDB.loser_seed,
+        SetDB.winner_score,
+        SetDB.loser_score,
+    ).select_from(SetDB)
+
+    return (
+        filter_sets_stmt(stmt, args)
+        .join(winner_players, true())
+        .join(loser_players, true())
+        .order_by(SetDB.id)
+    )
+
+
+def fetch_sets_batches_iter(
+    session: Session,
+    stmt: Select,
+) -> Generator[Sequence[Row], None, None]:
+    """Streams the rows of `stmt` by batches with a server-side cursor"""
+    result = session.execute(stmt.execution_options(yield_per=YIELD_PER))
+
+    yield from result.partitions()
+
+
+def get_set_csv_row(set_row: Row, max_players_count: int) -> list:
+    winner_team_players_count = len(set_row.winner_player_ids or [])
+    loser_team_players_count = len(set_row.loser_player_ids or [])
 
+    padWinnerPlayers = (
+        [None] * (max_players_count - winner_team_players_count)
+    )
+    padLoserPlayers = (
+        [None] * (max_players_count - loser_team_players_count)
+    )
+
+    return [
+        set_row.id,
+        set_row.start_at,
+        f"{set_row.tournament_name} ({set_row.tournament_id})",
+        f"{set_row.event_name} ({set_row.event_id})",
+        set_row.num_entrants,
+        *[
+            f"{gamer_tag} ({player_id})"
+            for player_id, gamer_tag in zip(
+                set_row.winner_player_ids or [],
+                set_row.winner_gamer_tags or [],
+            )
+        ],
+        *padWinnerPlayers,
+        *[
+            f"{gamer_tag} ({player_id})"
+            for player_id, gamer_tag in zip(
+                set_row.loser_player_ids or [],
+                set_row.loser_gamer_tags or [],
+            )
+        ],
+        *padLoserPlayers,
+        set_row.winner_seed,
+        set_row.loser_seed,
+        set_row.winner_score,
+        set_row.loser_score,
+        winner_team_players_count,
+        loser_team_players_count,
+    ]
+
+
+def write_csv(
+    output_path: str,
+    sets_batches: Iterable[Sequence[Row]],
+    max_players_count: int,
+) -> int:
+    set_count = 0
     with open(output_path, 'w', newline='') as myfile:
         wr = csv.writer(myfile, quoting=csv.QUOTE_ALL)
 
@@ -88,46 +210,282 @@ def main(args: argparse.Namespace):
             'loser_team_players_count',
         ])
 
-        for set_db in sets:
-            winner_team_players_count = len(set_db.winner_team.players)
-            loser_team_players_count = len(set_db.loser_team.players)
+        for sets_rows in sets_batches:
+            for set_row in sets_rows:
+                wr.writerow(get_set_csv_row(set_row, max_players_count))
+            set_count += len(sets_rows)
+
+    return set_count
+
+
+def get_arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('set_id', pa.int64()),
+        ('event_date', pa.timestamp('us', tz='UTC')),
+        ('tournament_id', pa.int64()),
+        ('tournament', pa.string()),
+        ('event_id', pa.int64()),
+        ('event', pa.string()),
+        ('event_entrants', pa.int32()),
+        ('winner_player_ids', pa.list_(pa.int64())),
+        ('winner_gamer_tags', pa.list_(pa.string())),
+        ('loser_player_ids', pa.list_(pa.int64())),
+        ('loser_gamer_tags', pa.list_(pa.string())),
+        ('winner_seed', pa.int32()),
+        ('loser_seed', pa.int32()),
+        ('winner_score', pa.int32()),
+        ('loser_score', pa.int32()),
+        ('winner_team_players_count', pa.int32()),
+        ('loser_team_players_count', pa.int32()),
+    ])
+
+
+def get_sets_record_batch(sets_rows: Sequence[Row], schema):
+    import pyarrow as pa
+
+    return pa.RecordBatch.from_pydict({
+        'set_id': [row.id for row in sets_rows],
+        'event_date': [row.start_at for row in sets_rows],
+        'tournament_id': [row.tournament_id for row in sets_rows],
+        'tournament': [row.tournament_name for row in sets_rows],
+        'event_id': [row.event_id for row in sets_rows],
+        'event': [row.event_name for row in sets_rows],
+        'event_entrants': [row.num_entrants for row in sets_rows],
+        'winner_player_ids': [row.winner_player_ids or [] for row in sets_rows],
+        'winner_gamer_tags': [row.winner_gamer_tags or [] for row in sets_rows],
+        'loser_player_ids': [row.loser_player_ids or [] for row in sets_rows],
+        'loser_gamer_tags': [row.loser_gamer_tags or [] for row in sets_rows],
+        'winner_seed': [row.winner_seed for row in sets_rows],
+        'loser_seed': [row.loser_seed for row in sets_rows],
+        'winner_score': [row.winner_score for row in sets_rows],
+        'loser_score': [row.loser_score for row in sets_rows],
+        'winner_team_players_count': [
+            len(row.winner_player_ids or []) for row in sets_rows
+        ],
+        'loser_team_players_count': [
+            len(row.loser_player_ids or []) for row in sets_rows
+        ],
+    }, schema=schema)
+
+
+def write_arrow(
+    output_path: str,
+    sets_batches: Iterable[Sequence[Row]],
+    file_format: str,
+) -> int:
+    """Writes typed columns to a parquet or arrow IPC file, one row group
+    (or record batch) per streamed batch of sets"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise Exception(
+            f"pyarrow is required for the {file_format} format, "
+            "install it with `poetry install --with export`"
+        )
+
+    schema = get_arrow_schema()
+    writer = (
+        pq.ParquetWriter(output_path, schema)
+        if file_format == 'parquet'
+        else pa.ipc.new_file(output_path, schema)
+    )
+
+    set_count = 0
+    with writer:
+        for sets_rows in sets_batches:
+            writer.write_batch(get_sets_record_batch(sets_rows, schema))
+            set_count += len(sets_rows)
+
+    return set_count
+
+
+def write_sets(
+    output_path: str,
+    session: Session,
+    sets_stmt: Select,
+    file_format: str,
+    max_players_count: int,
+) -> int:
+    sets_batches = fetch_sets_batches_iter(session, sets_stmt)
+
+    if file_format == 'csv':
+        return write_csv(output_path, sets_batches, max_players_count)
+    return write_arrow(output_path, sets_batches, file_format)
 
-            padWinnerPlayers = (
-                [None] * (max_players_count - winner_team_players_count)
-            )
-            padLoserPlayers = (
-                [None] * (max_players_count - loser_team_players_count)
-            )
 
-            wr.writerow([
-                set_db.id,
-                set_db.event.start_at,
-                f"{set_db.event.tournament.name} ({set_db.event.tournament.id})",
-                f"{set_db.event.name} ({set_db.event.id})",
-                set_db.event.num_entrants,
-                *[
-                    f"{winner_player.gamer_tag} ({winner_player.id})"
-                    for winner_player in set_db.winner_team.players
-                ],
-                *padWinnerPlayers,
-                *[
-                    f"{loser_player.gamer_tag} ({loser_player.id})"
-                    for loser_player in set_db.loser_team.players
-                ],
-                *padLoserPlayers,
-                set_db.winner_seed,
-                set_db.loser_seed,
-                set_db.winner_score,
-                set_db.loser_score,
-                winner_team_players_count,
-                loser_team_players_count,
-            ])
-    print(f"> Exported data to {output_path}")
+def export_partition(
+    args: argparse.Namespace,
+    output_path: str,
+    max_players_count: int,
+) -> int:
+    """Exports the sets of `args` date range on its own connection, run in
+    a worker process"""
+    load_dotenv()
+    session = load_database()
+
+    set_count = write_sets(
+        output_path,
+        session,
+        get_sets_stmt(args),
+        args.format,
+        max_players_count,
+    )
+
+    session.close()
+    print(f"> Exported {set_count} sets to {output_path}")
+    return set_count
+
+
+def concat_shards(shard_paths: List[str], output_path: str, file_format: str):
+    """Concatenates shards in order, each shard being sorted by set id"""
+    if file_format == 'csv':
+        with open(output_path, 'w', newline='') as output_file:
+            for i, shard_path in enumerate(shard_paths):
+                with open(shard_path, newline='') as shard_file:
+                    header = shard_file.readline()
+                    if i == 0:
+                        output_file.write(header)
+                    shutil.copyfileobj(shard_file, output_file)
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = get_arrow_schema()
+    writer = (
+        pq.ParquetWriter(output_path, schema)
+        if file_format == 'parquet'
+        else pa.ipc.new_file(output_path, schema)
+    )
+
+    with writer:
+        for shard_path in shard_paths:
+            if file_format == 'parquet':
+                for batch in pq.ParquetFile(shard_path).iter_batches(YIELD_PER):
+                    writer.write_batch(batch)
+            else:
+                with pa.memory_map(shard_path) as source:
+                    reader = pa.ipc.open_file(source)
+                    for i in range(reader.num_record_batches):
+                        writer.write_batch(reader.get_batch(i))
+
+
+def export_partitions(
+    args: argparse.Namespace,
+    output_path: str,
+    max_players_count: int,
+) -> int:
+    date_partitions = get_date_partitions(
+        args.startDate, args.endDate, args.partitions
+    )
+    output_root, extension = os.path.splitext(output_path)
+    shard_paths = [
+        f"{output_root}-{i:03}{extension}" for i in range(len(date_partitions))
+    ]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        set_counts = executor.map(
+            export_partition,
+            [
+                argparse.Namespace(**{
+                    **vars(args),
+                    'startDate': partition_start,
+                    'endDate': partition_end,
+                })
+                for partition_start, partition_end in date_partitions
+            ],
+            shard_paths,
+            [max_players_count] * len(shard_paths),
+        )
+        set_count = sum(set_counts)
+
+    if args.concat:
+        concat_shards(shard_paths, output_path, args.format)
+        for shard_path in shard_paths:
+            os.remove(shard_path)
+    else:
+        print(f"> Exported {len(shard_paths)} shards")
+
+    return set_count
+
+
+def main(args: argparse.Namespace):
+    load_dotenv()
+    session = load_database()
+
+    args.afterSetId = None
+    args.afterImportXid = None
+    args.beforeImportXid = None
+    if args.sinceLast:
+        watermark = load_watermark(args)
+        args.afterSetId = watermark.get('last_set_id')
+        args.afterImportXid = watermark.get('import_xmin')
+        # Every transaction before the xmin of the snapshot is finished, the
+        # sets of those still running are left to the next export
+        args.beforeImportXid = session.scalar(select(
+            cast(cast(
+                func.pg_snapshot_xmin(func.pg_current_snapshot()), Text
+            ), BigInteger)
+        ))
+
+        if session.scalar(
+            filter_sets_stmt(select(SetDB.id), args).limit(1)
+        ) is None:
+            session.close()
+            save_watermark(args, args.beforeImportXid)
+            print("> No new sets since the last export")
+            return
+
+    now_timestamp = datetime.now().timestamp()
+    extension = FILE_EXTENSIONS[args.format]
+    if args.sinceLast:
+        extension = f"delta.{extension}"
+    output_filename = f"{now_timestamp}-{args.outSuffix}.{extension}" if args.outSuffix else f"{now_timestamp}.{extension}"
+    output_path = f"output/{output_filename}"
+
+    fetch_time_start = datetime.now()
+    max_players_count = fetch_max_players_count(
+        session, filter_sets_stmt(select(SetDB), args)
+    ) if args.format == 'csv' else 0
+
+    if args.partitions:
+        session.close()
+        set_count = export_partitions(args, output_path, max_players_count)
+    else:
+        set_count = write_sets(
+            output_path,
+            session,
+            get_sets_stmt(args),
+            args.format,
+            max_players_count,
+        )
+        session.close()
+
+    delta_time = datetime.now() - fetch_time_start
+    print(f"> Exported {set_count} sets, delta time: {delta_time}")
+    if not args.partitions or args.concat:
+        print(f"> Exported data to {output_path}")
+
+    if args.sinceLast:
+        save_watermark(args, args.beforeImportXid)
+
+
+def parse_partitions(value: str) -> str | None:
+    if value == 'None':
+        return None
+    if value != 'month' and not (value.isdigit() and int(value) > 0):
+        raise argparse.ArgumentTypeError(
+            "partitions must be `month` or a positive integer"
+        )
+    return value
 
 
 def load_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description='Fetches sets from database and saves them in a local csv'
+        description='Fetches sets from database and saves them in a local csv, parquet or arrow file'
     )
 
     parser.add_argument(
@@ -158,12 +516,51 @@ def load_args() -> argparse.Namespace:
         type=parse_str_or_none,
         help='AddrState of the tournament, can be set to `None` (default: IDF)'
     )
+    parser.add_argument(
+        '--videogame',
+        action='store',
+        default=[STARTGG_ULTIMATE_VIDEOGAME_ID],
+        nargs='+',
+        type=int,
+        help=f'start.gg ids of the games of the exported sets (default: {STARTGG_ULTIMATE_VIDEOGAME_ID})'
+    )
     parser.add_argument(
         '--outSuffix',
         action='store',
         default=None,
         type=str,
-        help='csv output filename to `output/{timestamp}-{outSuffix}.csv` (default: `output/{timestamp}.csv`)'
+        help='output filename to `output/{timestamp}-{outSuffix}.{format}` (default: `output/{timestamp}.{format}`)'
+    )
+    parser.add_argument(
+        '--format',
+        action='store',
+        default='csv',
+        choices=FILE_EXTENSIONS.keys(),
+        help='output file format, parquet and arrow require pyarrow (default: csv)'
+    )
+    parser.add_argument(
+        '--partitions',
+        action='store',
+        default=None,
+        type=parse_partitions,
+        help='split the date range by `month` or into N ranges, each exported in parallel to its own shard file (default: None)'
+    )
+    parser.add_argument(
+        '--workers',
+        action='store',
+        default=os.cpu_count(),
+        type=int,
+        help='number of processes exporting partitions (default: cpu count)'
+    )
+    parser.add_argument(
+        '--concat',
+        action='store_true',
+        help='concatenate the partitions shards into a single output file'
+    )
+    parser.add_argument(
+        '--sinceLast',
+        action='store_true',
+        help='only export the sets added since the last `--sinceLast` export with the same filters, to `output/{timestamp}.delta.{format}`'
     )
 
     args = parser.parse_args()
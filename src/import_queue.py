@@ -0,0 +1,294 @@
+import argparse
+import os
+import socket
+import threading
+from datetime import timedelta
+from time import sleep
+from typing import Dict, Generator, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from main import (SyncProgress, configure_event_blacklist, configure_metrics,
+                  configure_startgg_client, fetch_events_sets_pages_iter,
+                  get_args_parser, get_pending_events_iter, handle_event_bulk,
+                  load_database, load_signal_handler, mark_event_imported,
+                  record_event_error)
+from models import EventDB, ImportJobDB, ImportJobStatus
+from queries.errors import StartggRequestError
+from queries.tournaments.getTournaments import get_tournaments_iter
+from utils.constants import IMPORT_JOB_LEASE, IMPORT_JOB_MAX_ATTEMPTS
+
+
+def enqueue_event(event: EventDB, session: Session):
+    """Adds a job for the event, failed jobs are queued again"""
+    session.execute(
+        insert(ImportJobDB)
+        .values(event_id=event.id, status=ImportJobStatus.PENDING)
+        .on_conflict_do_update(
+            index_elements=[ImportJobDB.event_id],
+            set_={
+                'status': ImportJobStatus.PENDING,
+                'attempts': 0,
+                'error': None,
+            },
+            where=ImportJobDB.status == ImportJobStatus.FAILED,
+        )
+    )
+    session.commit()
+
+
+def coordinate(session: Session, args: argparse.Namespace):
+    configure_startgg_client(args)
+    configure_event_blacklist(args)
+    tournaments = get_tournaments_iter({
+        'afterDate': args.startDate,
+        'beforeDate': args.endDate,
+        'countryCode': args.countryCode,
+        'addrState': args.addrState,
+        'minEntrants': args.minEntrants,
+        'videogameIds': args.videogame,
+    }, args.discoveryConcurrency)
+
+    event_count = 0
+    for event in get_pending_events_iter(
+        tournaments, session, SyncProgress(None)
+    ):
+        enqueue_event(event, session)
+        event_count += 1
+
+    print(f"> Enqueued {event_count} events")
+
+
+def fail_exhausted_jobs(session: Session):
+    session.execute(
+        update(ImportJobDB)
+        .where(
+            ImportJobDB.status == ImportJobStatus.RUNNING,
+            ImportJobDB.leased_until < func.now(),
+            ImportJobDB.attempts >= IMPORT_JOB_MAX_ATTEMPTS,
+        )
+        .values(
+            status=ImportJobStatus.FAILED,
+            error=f"Lease expired {IMPORT_JOB_MAX_ATTEMPTS} times",
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim_job(
+    session: Session,
+    worker_id: str,
+    lease: int,
+) -> Optional[ImportJobDB]:
+    """Leases the oldest pending job, or one whose worker stopped sending
+    heartbeats. Rows locked by other workers are skipped, not waited on."""
+    fail_exhausted_jobs(session)
+
+    claimable_job_id = (
+        select(ImportJobDB.id)
+        .where(or_(
+            ImportJobDB.status == ImportJobStatus.PENDING,
+            and_(
+                ImportJobDB.status == ImportJobStatus.RUNNING,
+                ImportJobDB.leased_until < func.now(),
+            ),
+        ))
+        .order_by(ImportJobDB.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+
+    job = session.scalar(
+        update(ImportJobDB)
+        .where(ImportJobDB.id == claimable_job_id)
+        .values(
+            status=ImportJobStatus.RUNNING,
+            worker_id=worker_id,
+            attempts=ImportJobDB.attempts + 1,
+            leased_until=func.now() + timedelta(seconds=lease),
+        )
+        .returning(ImportJobDB)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+
+    return job
+
+
+def finish_job(
+    job: ImportJobDB,
+    worker_id: str,
+    session: Session,
+    error: Optional[StartggRequestError] = None,
+):
+    result = session.execute(
+        update(ImportJobDB)
+        .where(
+            ImportJobDB.id == job.id,
+            ImportJobDB.worker_id == worker_id,
+        )
+        .values(
+            status=ImportJobStatus.DONE if error is None
+            else ImportJobStatus.FAILED,
+            error=None if error is None else f"{type(error).__name__}: {error}",
+            leased_until=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+
+    if result.rowcount == 0:  # type: ignore[attr-defined]
+        # Sets are written idempotently, the other worker's import is kept
+        print(f"> Lease of EVENT [{job.event_id}] was taken by another worker")
+
+
+class LeaseHeartbeat:
+    """Extends the lease of every job running on this worker, from a
+    background thread with its own session"""
+
+    def __init__(self, session: Session, worker_id: str, lease: int):
+        self.bind = session.get_bind()
+        self.worker_id = worker_id
+        self.lease = lease
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        with Session(self.bind) as session:
+            while not self.stopped.wait(self.lease / 3):
+                try:
+                    session.execute(
+                        update(ImportJobDB)
+                        .where(
+                            ImportJobDB.worker_id == self.worker_id,
+                            ImportJobDB.status == ImportJobStatus.RUNNING,
+                        )
+                        .values(
+                            leased_until=func.now() +
+                            timedelta(seconds=self.lease),
+                        )
+                    )
+                    session.commit()
+                except SQLAlchemyError as e:
+                    print(f"> Heartbeat failed: {e}")
+                    session.rollback()
+
+
+def get_claimed_events_iter(
+    session: Session,
+    args: argparse.Namespace,
+    worker_id: str,
+    jobs: Dict[int, ImportJobDB],
+) -> Generator[EventDB, None, None]:
+    while True:
+        job = claim_job(session, worker_id, args.lease)
+
+        if job is None:
+            if not args.wait:
+                return
+            sleep(args.pollInterval)
+            continue
+
+        event = session.get(EventDB, job.event_id)
+        if event is None:
+            continue
+
+        jobs[event.id] = job
+        yield event
+
+
+def work(session: Session, args: argparse.Namespace):
+    configure_startgg_client(args)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"> Worker {worker_id}")
+
+    # Tournaments are marked imported by whichever worker finishes their
+    # last event, the watermark of `--incremental` is left to main.py
+    progress = SyncProgress(None)
+    jobs: Dict[int, ImportJobDB] = {}
+    heartbeat = LeaseHeartbeat(session, worker_id, args.lease)
+    heartbeat.start()
+
+    try:
+        for event, event_sets_pages in fetch_events_sets_pages_iter(
+            get_claimed_events_iter(session, args, worker_id, jobs),
+            args.concurrency,
+            session if args.prepass else None,
+            args.batchEvents,
+        ):
+            job = jobs.pop(event.id)
+            try:
+                # Workers share players and teams, only INSERT ... ON
+                # CONFLICT DO NOTHING is safe against concurrent imports
+                handle_event_bulk(event, event_sets_pages, session)
+            except StartggRequestError as e:
+                record_event_error(event, e, session)
+                finish_job(job, worker_id, session, e)
+                continue
+
+            mark_event_imported(event, session, progress)
+            finish_job(job, worker_id, session)
+    finally:
+        heartbeat.stop()
+
+
+def load_args() -> argparse.Namespace:
+    parser = get_args_parser(
+        'Imports sets from start.gg through a work queue shared by several workers'
+    )
+
+    parser.add_argument(
+        'role',
+        choices=['coordinator', 'worker'],
+        help='coordinator enqueues the events of the tournaments found, workers import them'
+    )
+    parser.add_argument(
+        '--lease',
+        action='store',
+        default=IMPORT_JOB_LEASE,
+        type=int,
+        help=f'Seconds before the job of a worker without heartbeat can be claimed again (default: {IMPORT_JOB_LEASE})'
+    )
+    parser.add_argument(
+        '--wait',
+        action='store_true',
+        help='Keep polling for new jobs once the queue is empty'
+    )
+    parser.add_argument(
+        '--pollInterval',
+        action='store',
+        default=30,
+        type=int,
+        help='Seconds between two polls of an empty queue with --wait (default: 30)'
+    )
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    args = load_args()
+    load_dotenv()
+    session = load_database()
+    load_signal_handler(session)
+
+    configure_metrics(args)
+    if args.role == 'coordinator':
+        coordinate(session, args)
+    else:
+        work(session, args)
+
+    session.close()
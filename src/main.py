@@ -1,21 +1,39 @@
 import argparse
+import atexit
 import os
 import signal
 import sys
-from typing import List, TypedDict
+from collections import deque
+from concurrent.futures import Future
+from time import perf_counter
+from typing import (Any, Deque, Dict, FrozenSet, Generator, Iterable, List,
+                    Optional, Set, Tuple, TypedDict, Union)
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, select
+from sqlalchemy import ARRAY, Integer, any_, cast, create_engine, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session, sessionmaker
 
 from customTypes.startgg import EventSet
-from models import EventDB, PlayerDB, SetDB, TeamDB, TournamentDB
-from queries.sets.getSets import get_event_sets_iter
+from models import (EventDB, PlayerDB, SetDB, SyncStateDB, TeamDB,
+                    TournamentDB, team_player)
+from queries.errors import StartggRequestError
+from queries.responseCache import ResponseCache
+from queries.sets.getSets import (EVENTS_BATCH_MAX_SETS, EventSetsPage,
+                                  get_batched_per_page, get_event_set_ids_list,
+                                  get_event_sets_pages_iter,
+                                  get_events_sets_pages_iters)
+from queries.startggClient import DEFAULT_POOL_SIZE, startgg_client
 from queries.tournaments.getTournaments import get_tournaments_iter
-from utils.constants import STARTGG_BASE_URL
+from utils.constants import STARTGG_BASE_URL, STARTGG_ULTIMATE_VIDEOGAME_ID
 from utils.getDateTimestamp import get_date_timestamp
+from utils.lruCache import LRUCache
+from utils.metrics import (InstrumentedSession, instrument_engine, metrics,
+                           start_metrics_server)
 from utils.parse_str_or_none import parse_str_or_none
-from utils.shouldSkipEvent import should_skip_event
+from utils.path import ROOT_DIR, upsert_dir
+from utils.prefetch import prefetch_iter
+from utils.shouldSkipEvent import load_event_blacklist, should_skip_event
 
 
 class Player(TypedDict):
@@ -30,10 +48,59 @@ class Team(TypedDict):
     score: int
 
 
-def get_player_db(player: Player, session: Session) -> PlayerDB:
-    saved_player_db = session.scalar(
-        select(PlayerDB).where(PlayerDB.id == player['id'])
-    )
+class ImportCache:
+    """Run-scoped identity map of the players and teams already resolved"""
+
+    def __init__(self, max_size: int):
+        self.players: LRUCache[int, PlayerDB] = LRUCache(max_size)
+        self.teams: LRUCache[int, TeamDB] = LRUCache(max_size)
+
+
+def warm_import_cache(
+    event_sets: List[EventSet],
+    session: Session,
+    cache: ImportCache,
+):
+    slots = [slot for event_set in event_sets for slot in event_set['slots']]
+
+    team_ids = {
+        slot['entrant']['id'] for slot in slots
+        if slot['entrant']['id'] not in cache.teams
+    }
+    player_ids = {
+        participant['player']['id'] for slot in slots
+        for participant in slot['entrant']['participants']
+        if participant['player']['id'] not in cache.players
+    }
+
+    if team_ids:
+        for team_db in session.scalars(
+            select(TeamDB).where(
+                TeamDB.id == any_(cast(list(team_ids), ARRAY(Integer)))
+            )
+        ):
+            cache.teams.put(team_db.id, team_db)
+
+    if player_ids:
+        for player_db in session.scalars(
+            select(PlayerDB).where(
+                PlayerDB.id == any_(cast(list(player_ids), ARRAY(Integer)))
+            )
+        ):
+            cache.players.put(player_db.id, player_db)
+
+
+def get_player_db(
+    player: Player,
+    session: Session,
+    cache: ImportCache,
+) -> PlayerDB:
+    saved_player_db = cache.players.get(player['id'])
+
+    if saved_player_db is None:
+        saved_player_db = session.scalar(
+            select(PlayerDB).where(PlayerDB.id == player['id'])
+        )
 
     if saved_player_db is None:
         saved_player_db = PlayerDB(
@@ -42,17 +109,22 @@ def get_player_db(player: Player, session: Session) -> PlayerDB:
         )
         session.add(saved_player_db)
 
+    cache.players.put(player['id'], saved_player_db)
     return saved_player_db
 
 
-def get_team_db(team: Team, session: Session) -> TeamDB:
-    saved_team_db = session.scalar(
-        select(TeamDB).where(TeamDB.id == team['id'])
-    )
+def get_team_db(team: Team, session: Session, cache: ImportCache) -> TeamDB:
+    saved_team_db = cache.teams.get(team['id'])
+
+    if saved_team_db is None:
+        saved_team_db = session.scalar(
+            select(TeamDB).where(TeamDB.id == team['id'])
+        )
 
     if saved_team_db is None:
         players = [
-            get_player_db(player, session) for player in team['players']
+            get_player_db(player, session, cache)
+            for player in team['players']
         ]
         saved_team_db = TeamDB(
             id=team['id'],
@@ -60,10 +132,12 @@ def get_team_db(team: Team, session: Session) -> TeamDB:
         )
         session.add(saved_team_db)
 
+    cache.teams.put(team['id'], saved_team_db)
     return saved_team_db
 
 
-def handle_set(event_set: EventSet, event: EventDB, session: Session) -> SetDB:
+def get_set_teams(event_set: EventSet) -> Tuple[Team, Team]:
+    """Returns the (winner, loser) teams of a set"""
     team1: Team = {
         'id': event_set['slots'][0]['entrant']['id'],
         'seed': event_set['slots'][0]['entrant']['initialSeedNum'],
@@ -84,74 +158,327 @@ def handle_set(event_set: EventSet, event: EventDB, session: Session) -> SetDB:
         } for participant in event_set['slots'][1]['entrant']['participants']]
     }
 
-    winnerTeam, loserTeam = (
+    return (
         team1, team2
     ) if team1['score'] > team2['score'] else (
         team2, team1
     )
 
-    saved_winner_team_db = get_team_db(winnerTeam, session)
-    saved_loser_team_db = get_team_db(loserTeam, session)
 
-    saved_set_db = SetDB(
-        id=event_set['id'],
-        winner_seed=winnerTeam['seed'],
-        loser_seed=loserTeam['seed'],
-        winner_score=winnerTeam['score'],
-        loser_score=loserTeam['score'],
-        winner_team=saved_winner_team_db,
-        loser_team=saved_loser_team_db,
-        event=event
+def handle_set(
+    event_set: EventSet,
+    event: EventDB,
+    session: Session,
+    cache: ImportCache,
+) -> SetDB:
+    with metrics.time('handle_set_seconds'):
+        winnerTeam, loserTeam = get_set_teams(event_set)
+
+        saved_winner_team_db = get_team_db(winnerTeam, session, cache)
+        saved_loser_team_db = get_team_db(loserTeam, session, cache)
+
+        saved_set_db = SetDB(
+            id=event_set['id'],
+            winner_seed=winnerTeam['seed'],
+            loser_seed=loserTeam['seed'],
+            winner_score=winnerTeam['score'],
+            loser_score=loserTeam['score'],
+            winner_team=saved_winner_team_db,
+            loser_team=saved_loser_team_db,
+            event=event
+        )
+        session.add(saved_set_db)
+        return saved_set_db
+
+
+class SetsRows(TypedDict):
+    players: Dict[int, Dict[str, Any]]
+    teams: Dict[int, Dict[str, Any]]
+    team_players: Set[Tuple[int, int]]
+    sets: Dict[int, Dict[str, Any]]
+
+
+def get_sets_rows(event_sets: List[EventSet], event_id: int) -> SetsRows:
+    rows: SetsRows = {
+        'players': {},
+        'teams': {},
+        'team_players': set(),
+        'sets': {},
+    }
+
+    for event_set in event_sets:
+        winnerTeam, loserTeam = get_set_teams(event_set)
+
+        for team in (winnerTeam, loserTeam):
+            rows['teams'][team['id']] = {'id': team['id']}
+            for player in team['players']:
+                rows['players'][player['id']] = {
+                    'id': player['id'],
+                    'gamer_tag': player['gamer_tag'],
+                }
+                rows['team_players'].add((team['id'], player['id']))
+
+        rows['sets'][event_set['id']] = {
+            'id': event_set['id'],
+            'winner_seed': winnerTeam['seed'],
+            'loser_seed': loserTeam['seed'],
+            'winner_score': winnerTeam['score'],
+            'loser_score': loserTeam['score'],
+            'winner_team_id': winnerTeam['id'],
+            'loser_team_id': loserTeam['id'],
+            'event_id': event_id,
+        }
+
+    return rows
+
+
+def bulk_insert_sets(event_sets: List[EventSet], event_id: int, session: Session):
+    """Writes a page of sets with one INSERT ... ON CONFLICT DO NOTHING per
+    table, so rows already saved are left untouched"""
+    rows = get_sets_rows(event_sets, event_id)
+
+    # Rows are inserted in primary key order, so that concurrent imports
+    # of shared players and teams wait on each other instead of deadlocking
+    statements = [
+        (insert(PlayerDB), [
+            rows['players'][player_id] for player_id in sorted(rows['players'])
+        ]),
+        (insert(TeamDB), [
+            rows['teams'][team_id] for team_id in sorted(rows['teams'])
+        ]),
+        (insert(team_player), [
+            {'team_id': team_id, 'player_id': player_id}
+            for team_id, player_id in sorted(rows['team_players'])
+        ]),
+        (insert(SetDB), list(rows['sets'].values())),
+    ]
+
+    for stmt, values in statements:
+        if values:
+            session.execute(stmt.values(values).on_conflict_do_nothing())
+
+
+def get_saved_set_ids(set_ids: List[int], session: Session) -> Set[int]:
+    if not set_ids:
+        return set()
+
+    return set(session.scalars(
+        select(SetDB.id).where(
+            SetDB.id == any_(cast(set_ids, ARRAY(Integer)))
+        )
+    ))
+
+
+def save_event_checkpoint(
+    event: EventDB,
+    page: EventSetsPage,
+    session: Session,
+):
+    event.sets_checkpoint_offset = page.end_offset
+    event.sets_checkpoint_total = page.total
+    session.commit()
+
+
+def record_event_metrics(event: EventDB, set_count: int, start: float):
+    """Throughput of an event import, fetching included"""
+    seconds = perf_counter() - start
+    sets_per_second = set_count / seconds if seconds > 0 else 0.0
+
+    metrics.inc('events_imported_total')
+    metrics.inc('sets_imported_total', set_count)
+    metrics.observe('event_import_seconds', seconds)
+    metrics.observe('event_sets_per_second', sets_per_second)
+    metrics.log(
+        'event',
+        event_id=event.id,
+        videogame_id=event.videogame_id,
+        sets=set_count,
+        seconds=seconds,
+        sets_per_second=sets_per_second,
     )
-    session.add(saved_set_db)
-    return saved_set_db
 
 
-def handle_event(event: EventDB, session: Session):
+def handle_event(
+    event: EventDB,
+    event_sets_pages: Iterable[EventSetsPage],
+    session: Session,
+    cache: ImportCache,
+):
     print(f"EVENT [{event.id}] : {STARTGG_BASE_URL}/{event.slug}")
+    start = perf_counter()
 
     set_count = 0
-    last_saved_set_count = 0
-    for event_set in get_event_sets_iter(event.id):
-        saved_set_db = session.scalar(
-            select(SetDB).where(SetDB.id == event_set['id'])
+    for page in event_sets_pages:
+        event_sets = page.sets
+        saved_set_ids = get_saved_set_ids(
+            [event_set['id'] for event_set in event_sets], session
         )
+        new_event_sets = [
+            event_set for event_set in event_sets
+            if event_set['id'] not in saved_set_ids
+        ]
+        warm_import_cache(new_event_sets, session, cache)
 
-        if saved_set_db:
-            continue
+        for event_set in new_event_sets:
+            if event_set['id'] in saved_set_ids:
+                continue
 
-        handle_set(event_set, event, session)
-        set_count += 1
+            handle_set(event_set, event, session, cache)
+            saved_set_ids.add(event_set['id'])
+            set_count += 1
 
-        if (set_count % 25 == 0):
-            last_saved_set_count = set_count
-            session.commit()
+            if (set_count % 25 == 0):
+                session.commit()
+
+        save_event_checkpoint(event, page, session)
+
+    record_event_metrics(event, set_count, start)
+
+
+def handle_event_bulk(
+    event: EventDB,
+    event_sets_pages: Iterable[EventSetsPage],
+    session: Session,
+):
+    print(f"EVENT [{event.id}] : {STARTGG_BASE_URL}/{event.slug}")
+    start = perf_counter()
+
+    set_count = 0
+    for page in event_sets_pages:
+        bulk_insert_sets(page.sets, event.id, session)
+        save_event_checkpoint(event, page, session)
+        set_count += len(page.sets)
+
+    record_event_metrics(event, set_count, start)
+
+
+def handle_tournament(
+    tournament: TournamentDB,
+    session: Session,
+) -> List[EventDB]:
+    metrics.inc('tournaments_handled_total')
 
-    if (set_count != last_saved_set_count):
+    pending_events = [
+        event for event in tournament.events
+        if not (should_skip_event(event) or event.imported is True)
+    ]
+
+    if not pending_events:
+        tournament.imported = True
         session.commit()
 
+    return pending_events
 
-def handle_tournament(tournament: TournamentDB, session: Session):
-    for event in tournament.events:
 
-        if should_skip_event(event) or event.imported is True:
-            # event_slug = event['slug'].split('/')[-1]
-            # print(f"SKIPPING EVENT : {event_slug} ({event['id']})")
-            continue
+class SyncProgress:
+    """Advances the sync watermark over the tournaments listed so far, in
+    listing order, up to the first one not fully imported yet"""
+
+    def __init__(self, sync_state: Optional[SyncStateDB]):
+        self.sync_state = sync_state
+        self.tournaments: Deque[TournamentDB] = deque()
+
+    def add(self, tournament: TournamentDB):
+        self.tournaments.append(tournament)
+
+    def advance(self) -> bool:
+        advanced = False
+
+        while self.tournaments and self.tournaments[0].imported is True:
+            tournament = self.tournaments.popleft()
+
+            if self.sync_state is not None and tournament.start_at is not None:
+                self.sync_state.last_start_at = tournament.start_at
+                advanced = True
+
+        return advanced
+
+
+def get_sync_state(session: Session, args: argparse.Namespace) -> SyncStateDB:
+    # Games synced together share a watermark, adding one starts over
+    videogame_ids = ','.join(str(id) for id in sorted(set(args.videogame)))
 
-        handle_event(event, session)
-        event.imported = True
+    sync_state = session.scalar(
+        select(SyncStateDB).where(
+            SyncStateDB.country_code.is_not_distinct_from(args.countryCode),
+            SyncStateDB.addr_state.is_not_distinct_from(args.addrState),
+            SyncStateDB.videogame_ids.is_not_distinct_from(videogame_ids),
+        )
+    )
+
+    if sync_state is None:
+        sync_state = SyncStateDB(
+            country_code=args.countryCode,
+            addr_state=args.addrState,
+            videogame_ids=videogame_ids,
+        )
+        session.add(sync_state)
         session.commit()
 
+    return sync_state
 
-def main(session: Session, args: argparse.Namespace):
-    tournaments = get_tournaments_iter({
-        'afterDate': args.startDate,
-        'beforeDate': args.endDate,
-        'countryCode': args.countryCode,
-        'addrState': args.addrState,
-    })
 
+def mark_event_imported(
+    event: EventDB,
+    session: Session,
+    progress: SyncProgress,
+):
+    event.imported = True
+    event.import_error = None
+    event.sets_checkpoint_offset = None
+    event.sets_checkpoint_total = None
+
+    tournament = event.tournament
+    if all(
+        should_skip_event(tournament_event) or tournament_event.imported is True
+        for tournament_event in tournament.events
+    ):
+        tournament.imported = True
+        progress.advance()
+
+    session.commit()
+
+
+def record_event_error(
+    event: EventDB,
+    error: StartggRequestError,
+    session: Session,
+):
+    """Keeps the sets already committed, the event stays not imported so it
+    is retried by the next run"""
+    session.rollback()
+
+    print(f"> Skipping EVENT [{event.id}] : {error}")
+    event.import_error = f"{type(error).__name__}: {error}"
+    session.commit()
+
+
+def merge_listed_events(
+    saved_tournament: TournamentDB,
+    tournament: TournamentDB,
+) -> bool:
+    """Adds the listed events not saved yet, like those of a game newly
+    passed to `--videogame`, to the saved tournament"""
+    saved_event_ids = {event.id for event in saved_tournament.events}
+    new_events = [
+        event for event in tournament.events
+        if event.id not in saved_event_ids
+    ]
+
+    for event in new_events:
+        saved_tournament.events.append(event)
+
+    if new_events:
+        saved_tournament.imported = False
+
+    return bool(new_events)
+
+
+def get_pending_events_iter(
+    tournaments: Iterable[TournamentDB],
+    session: Session,
+    progress: SyncProgress,
+) -> Generator[EventDB, None, None]:
     for tournament in tournaments:
         saved_tournament = session.scalar(
             select(TournamentDB).where(TournamentDB.id == tournament.id)
@@ -161,13 +488,239 @@ def main(session: Session, args: argparse.Namespace):
             saved_tournament = tournament
             session.add(saved_tournament)
             session.commit()
+        else:
+            if saved_tournament.start_at is None:
+                saved_tournament.start_at = tournament.start_at
+            if merge_listed_events(saved_tournament, tournament):
+                session.commit()
+
+        progress.add(saved_tournament)
 
         if (saved_tournament.imported is True):
+            if progress.advance():
+                session.commit()
             continue
 
-        handle_tournament(saved_tournament, session)
-        saved_tournament.imported = True
-        session.commit()
+        pending_events = handle_tournament(saved_tournament, session)
+
+        if progress.advance():
+            session.commit()
+
+        yield from pending_events
+
+
+def get_event_saved_set_ids(
+    event: EventDB,
+    session: Session,
+) -> Optional[FrozenSet[int]]:
+    """Ids of the sets of the event already saved, `None` if there are none,
+    in which case the prepass would only cost requests"""
+    saved_set_ids = frozenset(session.scalars(
+        select(SetDB.id).where(SetDB.event_id == event.id)
+    ))
+    return saved_set_ids or None
+
+
+def get_missing_set_offsets(
+    event_id: int,
+    saved_set_ids: FrozenSet[int],
+) -> Optional[List[int]]:
+    """Offsets of the sets of the event not saved yet, in the order of the
+    sets query, listed with an id-only query. `None` if the listing failed,
+    in which case every page is fetched."""
+    try:
+        set_ids = get_event_set_ids_list(event_id)
+    except StartggRequestError as e:
+        print(f"> Set ids prepass of EVENT [{event_id}] failed : {e}")
+        return None
+
+    missing_set_offsets = [
+        offset for offset, set_id in enumerate(set_ids)
+        if set_id not in saved_set_ids
+    ]
+    print(f"> {len(missing_set_offsets)}/{len(set_ids)} sets to fetch")
+
+    return missing_set_offsets
+
+
+def get_events_batches_iter(
+    events: Iterable[EventDB],
+) -> Generator[List[EventDB], None, None]:
+    """Groups the small events without checkpoint whose sets can be fetched
+    together in one request, other events are yielded alone"""
+    batch: List[EventDB] = []
+    batch_size = 0
+
+    for event in events:
+        per_page = None if event.sets_checkpoint_offset else (
+            get_batched_per_page(event.num_entrants)
+        )
+
+        if per_page is None:
+            yield [event]
+            continue
+
+        if batch and batch_size + per_page > EVENTS_BATCH_MAX_SETS:
+            yield batch
+            batch = []
+            batch_size = 0
+
+        batch.append(event)
+        batch_size += per_page
+
+    if batch:
+        yield batch
+
+
+EventsSetsKey = Union[
+    Tuple[int, int, Optional[FrozenSet[int]], Optional[int]], Dict[int, int]
+]
+
+
+def fetch_events_sets_pages_iter(
+    events: Iterable[EventDB],
+    concurrency: int,
+    prepass_session: Optional[Session] = None,
+    batch_events: bool = False,
+) -> Generator[Tuple[EventDB, Iterable[EventSetsPage]], None, None]:
+    """Fetches the sets of each event, from its checkpoint if any. With a
+    `prepass_session`, only the pages with sets not saved yet are fetched
+    for events with saved sets, the session is only used by the calling
+    thread. With `batch_events`, small events share requests and skip the
+    prepass."""
+    def get_fetch_key(events_batch: List[EventDB]) -> EventsSetsKey:
+        if len(events_batch) > 1:
+            return {
+                event.id: get_batched_per_page(event.num_entrants) or 0
+                for event in events_batch
+            }
+
+        event = events_batch[0]
+        return (
+            event.id,
+            event.sets_checkpoint_offset or 0,
+            get_event_saved_set_ids(event, prepass_session)
+            if prepass_session is not None else None,
+            event.sets_checkpoint_total,
+        )
+
+    def fetch(key: EventsSetsKey) -> List[Iterable[EventSetsPage]]:
+        if isinstance(key, dict):
+            return get_events_sets_pages_iters(key)
+
+        event_id, start_offset, saved_set_ids, checkpoint_total = key
+        wanted_offsets = get_missing_set_offsets(
+            event_id, saved_set_ids
+        ) if saved_set_ids is not None else None
+        return [get_event_sets_pages_iter(
+            event_id, start_offset, wanted_offsets, checkpoint_total
+        )]
+
+    events_batches = (
+        get_events_batches_iter(events) if batch_events
+        else ([event] for event in events)
+    )
+
+    if concurrency <= 1:
+        for events_batch in events_batches:
+            yield from zip(events_batch, fetch(get_fetch_key(events_batch)))
+        return
+
+    def fetch_all(key: EventsSetsKey) -> List[List[EventSetsPage]]:
+        return [list(pages) for pages in fetch(key)]
+
+    def get_future_iter(future: Future[List[List[EventSetsPage]]], index: int):
+        yield from future.result()[index]
+
+    for events_batch, future in prefetch_iter(
+        events_batches,
+        get_fetch_key,
+        fetch_all,
+        concurrency,
+    ):
+        for index, event in enumerate(events_batch):
+            yield event, get_future_iter(future, index)
+
+
+def configure_startgg_client(args: argparse.Namespace):
+    startgg_client.set_pool_size(max(args.concurrency, DEFAULT_POOL_SIZE))
+    startgg_client.set_response_cache(
+        ResponseCache(
+            os.path.join(ROOT_DIR, args.responseCacheDir),
+            args.responseCacheMaxSize * 1024 * 1024,
+        ) if args.responseCacheDir else None,
+        offline=args.offline,
+    )
+
+
+def configure_event_blacklist(args: argparse.Namespace):
+    if args.blacklistFile or args.blacklist:
+        load_event_blacklist(
+            os.path.join(ROOT_DIR, args.blacklistFile)
+            if args.blacklistFile else None,
+            args.blacklist,
+        )
+
+
+def configure_metrics(args: argparse.Namespace):
+    if args.metricsFile:
+        upsert_dir(os.path.dirname(args.metricsFile))
+        metrics.file_path = os.path.join(ROOT_DIR, args.metricsFile)
+        # Also run by sys.exit in the SIGINT handler
+        atexit.register(metrics.log_snapshot)
+
+    if args.metricsPort:
+        start_metrics_server(args.metricsPort)
+
+
+def main(session: Session, args: argparse.Namespace):
+    configure_startgg_client(args)
+    configure_event_blacklist(args)
+    configure_metrics(args)
+
+    with metrics.time('import_run_seconds'):
+        run_import(session, args)
+
+
+def run_import(session: Session, args: argparse.Namespace):
+    cache = ImportCache(args.cacheSize)
+
+    after_date = args.startDate
+    sync_state = get_sync_state(session, args) if args.incremental else None
+    if sync_state is not None and sync_state.last_start_at is not None:
+        after_date = max(
+            after_date, int(sync_state.last_start_at.timestamp())
+        )
+        print(f"> Resuming sync from {sync_state.last_start_at}")
+
+    tournaments = get_tournaments_iter({
+        'afterDate': after_date,
+        'beforeDate': args.endDate,
+        'countryCode': args.countryCode,
+        'addrState': args.addrState,
+        'minEntrants': args.minEntrants,
+        'videogameIds': args.videogame,
+    }, args.discoveryConcurrency)
+
+    progress = SyncProgress(sync_state)
+    events = get_pending_events_iter(tournaments, session, progress)
+
+    for event, event_sets_pages in fetch_events_sets_pages_iter(
+        events,
+        args.concurrency,
+        session if args.prepass else None,
+        args.batchEvents,
+    ):
+        try:
+            if args.bulkInsert:
+                handle_event_bulk(event, event_sets_pages, session)
+            else:
+                handle_event(event, event_sets_pages, session, cache)
+        except StartggRequestError as e:
+            record_event_error(event, e, session)
+            continue
+
+        mark_event_imported(event, session, progress)
 
 
 def load_database(echo=False) -> Session:
@@ -176,7 +729,8 @@ def load_database(echo=False) -> Session:
         raise Exception("DATABASE_URL is missing")
 
     engine = create_engine(DATABASE_URL, echo=echo)
-    SessionLocal = sessionmaker(bind=engine)
+    instrument_engine(engine)
+    SessionLocal = sessionmaker(bind=engine, class_=InstrumentedSession)
     session = SessionLocal()
 
     return session
@@ -184,6 +738,8 @@ def load_database(echo=False) -> Session:
 
 def load_signal_handler(session: Session):
     def signal_handler(sig, frame):
+        # Event checkpoints are only advanced once their page is fully
+        # handled, so committing keeps them consistent with the saved sets
         print(' Saving before exiting...')
         session.commit()
         session.close()
@@ -192,10 +748,10 @@ def load_signal_handler(session: Session):
     signal.signal(signal.SIGINT, signal_handler)
 
 
-def load_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(
-        description='Fetches sets from start.gg and saves them into a postgres database'
-    )
+def get_args_parser(description: str) -> argparse.ArgumentParser:
+    """Options shared by every import script, those only used by main.py
+    are added in `load_args`"""
+    parser = argparse.ArgumentParser(description=description)
 
     parser.add_argument(
         '--startDate',
@@ -225,6 +781,118 @@ def load_args() -> argparse.Namespace:
         type=parse_str_or_none,
         help='AddrState of the tournament, can be set to `None` (default: IDF)'
     )
+    parser.add_argument(
+        '--videogame',
+        action='store',
+        default=[STARTGG_ULTIMATE_VIDEOGAME_ID],
+        nargs='+',
+        type=int,
+        help=f'start.gg ids of the games whose events are imported, in a single pass over the tournaments (default: {STARTGG_ULTIMATE_VIDEOGAME_ID})'
+    )
+    parser.add_argument(
+        '--minEntrants',
+        action='store',
+        default=2,
+        type=int,
+        help='Skip the events with fewer entrants (default: 2)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        action='store',
+        default=1,
+        type=int,
+        help='Number of events whose sets are fetched in parallel (default: 1)'
+    )
+    parser.add_argument(
+        '--discoveryConcurrency',
+        action='store',
+        default=1,
+        type=int,
+        help='Number of months whose tournaments are listed in parallel (default: 1)'
+    )
+    parser.add_argument(
+        '--responseCacheDir',
+        action='store',
+        default="output/cache",
+        type=parse_str_or_none,
+        help='Directory where start.gg responses are cached, can be set to `None` (default: output/cache)'
+    )
+    parser.add_argument(
+        '--responseCacheMaxSize',
+        action='store',
+        default=1024,
+        type=int,
+        help='Max size of the response cache in MB (default: 1024)'
+    )
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help='Replay cached start.gg responses without any network request'
+    )
+    parser.add_argument(
+        '--prepass',
+        action='store_true',
+        help='List the set ids of each event first and only fetch the pages with sets not saved yet'
+    )
+    parser.add_argument(
+        '--batchEvents',
+        action='store_true',
+        help='Fetch the sets of small events together, one alias per event in a single request'
+    )
+    parser.add_argument(
+        '--blacklistFile',
+        action='store',
+        default=None,
+        type=str,
+        help='File of regex patterns, one per line, of event slugs to skip in addition to the default ones'
+    )
+    parser.add_argument(
+        '--blacklist',
+        action='append',
+        default=[],
+        type=str,
+        help='Regex pattern of event slugs to skip in addition to the default ones, can be repeated'
+    )
+    parser.add_argument(
+        '--metricsFile',
+        action='store',
+        default="output/metrics.jsonl",
+        type=parse_str_or_none,
+        help='JSON-lines file receiving a record per imported event and the metrics of the run, can be set to `None` (default: output/metrics.jsonl)'
+    )
+    parser.add_argument(
+        '--metricsPort',
+        action='store',
+        default=None,
+        type=int,
+        help='Port serving the metrics in the Prometheus text format on /metrics (default: None)'
+    )
+
+    return parser
+
+
+def load_args() -> argparse.Namespace:
+    parser = get_args_parser(
+        'Fetches sets from start.gg and saves them into a postgres database'
+    )
+
+    parser.add_argument(
+        '--cacheSize',
+        action='store',
+        default=10000,
+        type=int,
+        help='Max players and teams kept in memory during the import (default: 10000)'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Only fetch tournaments after the last one fully synced with the same countryCode and addrState'
+    )
+    parser.add_argument(
+        '--bulkInsert',
+        action='store_true',
+        help='Write each page of sets with multi-row INSERT ... ON CONFLICT DO NOTHING'
+    )
 
     args = parser.parse_args()
     return args
@@ -2,7 +2,8 @@ import enum
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, Table, Text
+from sqlalchemy import (BigInteger, Column, DateTime, Enum, ForeignKey, Integer,
+                        Table, Text, text)
 from sqlalchemy.orm import (DeclarativeBase, Mapped, MappedAsDataclass,
                             mapped_column, relationship)
 from sqlalchemy.sql import func
@@ -27,6 +28,19 @@ class ActivityState(enum.Enum):
     QUEUED = "QUEUED"
 
 
+class ImportJobStatus(enum.Enum):
+    """enum ImportJobStatus
+    PENDING: Job is waiting to be claimed by a worker
+    RUNNING: Job is leased by a worker
+    DONE: Sets of the event are imported
+    FAILED: Import failed, the job is retried by the next coordinator run
+    """
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
 class Base(MappedAsDataclass, DeclarativeBase):
     pass
 
@@ -47,6 +61,10 @@ class TournamentDB(Base):
         passive_deletes=True,
     )
 
+    start_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         init=False,
@@ -101,6 +119,29 @@ class EventDB(Base):
     )
 
     imported: Mapped[bool] = mapped_column(default=False)
+    import_error: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    """Last error that prevented the sets of the event to be imported"""
+
+    sets_checkpoint_offset: Mapped[Optional[int]] = mapped_column(
+        Integer, default=None
+    )
+    """Number of sets fully imported, in the order of the sets query"""
+    sets_checkpoint_total: Mapped[Optional[int]] = mapped_column(
+        Integer, default=None
+    )
+    """Number of sets of the event when checkpointed, a different total on
+    resume means the offsets moved"""
+
+    blacklisted: Mapped[Optional[bool]] = mapped_column(default=None)
+    """Whether the slug matched a blacklisted pattern, `None` if undecided"""
+    blacklist_pattern: Mapped[Optional[str]] = mapped_column(
+        Text, default=None
+    )
+
+    videogame_id: Mapped[Optional[int]] = mapped_column(
+        Integer, default=None, index=True
+    )
+    """start.gg id of the game of the event"""
 
     def __repr__(self) -> str:
         return f"EventDB(id={self.id!r}, name={self.name!r})"
@@ -140,6 +181,14 @@ class SetDB(Base):
         back_populates="sets"
     )
 
+    import_xid: Mapped[int] = mapped_column(
+        BigInteger,
+        server_default=text("(pg_current_xact_id()::text::bigint)"),
+        index=True,
+        init=False,
+    )
+    """Id of the transaction which inserted the set"""
+
     def __repr__(self) -> str:
         return f"SetDB(id={self.id!r})"
 
@@ -197,3 +246,79 @@ class PlayerDB(Base):
 
     def __repr__(self) -> str:
         return f"PlayerDB(id={self.id!r}, gamer_tag={self.gamer_tag!r})"
+
+
+class SyncStateDB(Base):
+    """Progress of the tournaments sync for a (country_code, addr_state)
+    filter, `None` meaning unfiltered"""
+    __tablename__ = "sync_state"
+
+    id: Mapped[int] = mapped_column(
+        primary_key=True, index=True, autoincrement=True, init=False
+    )
+    country_code: Mapped[Optional[str]] = mapped_column(Text)
+    addr_state: Mapped[Optional[str]] = mapped_column(Text)
+
+    last_start_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
+    """startAt of the last tournament fully processed"""
+    videogame_ids: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    """Sorted comma separated ids of the games synced together"""
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        init=False,
+        server_default=func.now(),
+        onupdate=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"SyncStateDB(country_code={self.country_code!r}, "
+            f"addr_state={self.addr_state!r}, "
+            f"videogame_ids={self.videogame_ids!r}, "
+            f"last_start_at={self.last_start_at!r})"
+        )
+
+
+class ImportJobDB(Base):
+    """Import of the sets of an event, claimed by one worker at a time"""
+    __tablename__ = "import_job"
+
+    id: Mapped[int] = mapped_column(
+        primary_key=True, index=True, autoincrement=True, init=False
+    )
+    event_id: Mapped[int] = mapped_column(
+        ForeignKey("event.id", ondelete="CASCADE"), unique=True
+    )
+
+    status: Mapped[ImportJobStatus] = mapped_column(
+        Enum(ImportJobStatus), default=ImportJobStatus.PENDING, index=True
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[Optional[str]] = mapped_column(Text, default=None)
+
+    worker_id: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    leased_until: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
+    """A RUNNING job whose lease expired can be claimed by another worker"""
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        init=False,
+        server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        init=False,
+        server_default=func.now(),
+        onupdate=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"ImportJobDB(event_id={self.event_id!r}, "
+            f"status={self.status!r})"
+        )
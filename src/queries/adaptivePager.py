@@ -0,0 +1,120 @@
+from bisect import bisect_left
+from typing import Any, Callable, Generator, List, NamedTuple, Optional, Tuple
+
+from queries.errors import (OfflineCacheMissError, QueryComplexityError,
+                            StartggRequestError)
+from utils.constants import STARTGG_MAX_QUERY_COMPLEXITY
+
+
+class PageSizeLimits(NamedTuple):
+    initial: int
+    minimum: int
+    maximum: int
+
+
+class AdaptivePageSize:
+    """Page size of a single listing.
+
+    Sizes are `minimum * 2^k` so that any offset reached with a size is
+    aligned with every smaller size, letting the size change in the middle
+    of a listing without skipping or repeating nodes.
+
+    Every listing starts again from `initial` and only adapts to its own
+    responses, so a listing replayed from the response cache asks for the
+    same pages as the run that filled it, whatever ran before or beside it.
+    """
+
+    def __init__(self, limits: PageSizeLimits):
+        self.minimum = limits.minimum
+        self.maximum = limits.maximum
+        self.size = limits.initial
+        self.failed_size = limits.maximum * 2
+        """Smallest size rejected for its complexity, never tried again"""
+
+    def get_size(self, offset: int) -> int:
+        """Largest size not above the current one aligned with `offset`"""
+        size = self.size
+
+        while size > self.minimum and offset % size != 0:
+            size //= 2
+        return size
+
+    def on_success(self, size: int, query_complexity: int):
+        """Doubles the size when twice the complexity stays under the limit"""
+        if (
+            size >= self.size and
+            size * 2 <= self.maximum and
+            size * 2 < self.failed_size and
+            query_complexity * 2 <= STARTGG_MAX_QUERY_COMPLEXITY * 0.8
+        ):
+            self.size = size * 2
+
+    def on_complexity_error(self, size: int, error: StartggRequestError):
+        if size <= self.minimum:
+            raise error
+
+        self.failed_size = min(self.failed_size, size)
+        self.size = min(self.size, size // 2)
+
+
+def get_adaptive_pages_iter(
+    fetch_page: Callable[[int, int], Any],
+    get_connection: Callable[[Any], Any],
+    page_size_limits: PageSizeLimits,
+    start_offset: int = 0,
+    wanted_offsets: Optional[List[int]] = None,
+) -> Generator[Tuple[Any, int], None, None]:
+    """Yields the responses of `fetch_page(page, perPage)`, with the offset
+    reached after each of them, until every node of the connection returned
+    by `get_connection(response)` from `start_offset` is fetched.
+
+    With sorted `wanted_offsets`, only the pages containing one of them are
+    fetched, shrunk while their second half has none.
+    """
+    page_size = AdaptivePageSize(page_size_limits)
+
+    # Only the last page can end on an offset not aligned with any size
+    offset = start_offset - start_offset % page_size.minimum
+    total = None
+
+    while total is None or offset < total:
+        if wanted_offsets is not None:
+            index = bisect_left(wanted_offsets, offset)
+            if index == len(wanted_offsets):
+                break
+
+            offset = max(
+                offset,
+                wanted_offsets[index] -
+                wanted_offsets[index] % page_size.minimum,
+            )
+
+        per_page = page_size.get_size(offset)
+
+        if wanted_offsets is not None:
+            while per_page > page_size.minimum and (
+                bisect_left(wanted_offsets, offset + per_page // 2) ==
+                bisect_left(wanted_offsets, offset + per_page)
+            ):
+                per_page //= 2
+
+        try:
+            response = fetch_page(offset // per_page + 1, per_page)
+        except (QueryComplexityError, OfflineCacheMissError) as e:
+            # Offline, a missing page is one the cached run got rejected for
+            # its complexity, it then went on with a smaller size
+            page_size.on_complexity_error(per_page, e)
+            continue
+
+        page_size.on_success(
+            per_page, response['extensions']['queryComplexity']
+        )
+
+        connection = get_connection(response)
+        total = connection['pageInfo']['total']
+
+        offset += len(connection['nodes'])
+        yield response, offset
+
+        if len(connection['nodes']) < per_page:
+            break
@@ -0,0 +1,38 @@
+from typing import Optional
+
+
+class StartggRequestError(Exception):
+    """A start.gg request that could not be completed"""
+
+
+class PermanentRequestError(StartggRequestError):
+    """Error that retrying the same request will not fix"""
+
+
+class TransientRequestError(StartggRequestError):
+    """Connection errors, 5xx or malformed responses, worth retrying"""
+
+
+class RateLimitError(TransientRequestError):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueryComplexityError(PermanentRequestError):
+    """Raised when start.gg rejects a request for its query complexity"""
+
+
+class OfflineCacheMissError(PermanentRequestError):
+    """Raised in offline mode when a response is not in the cache"""
+
+
+def get_message_error(message: str) -> StartggRequestError:
+    """Classifies an error message returned by the API"""
+    lower_message = message.lower()
+
+    if 'rate limit' in lower_message or 'too many requests' in lower_message:
+        return RateLimitError(message)
+    if 'complexity' in lower_message:
+        return QueryComplexityError(message)
+    return PermanentRequestError(message)
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import threading
+from time import time
+from typing import Any, Dict, Optional
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of start.gg responses.
+
+    Responses are stored as `{directory}/{key[:2]}/{key}.json` where the
+    key hashes the query and its variables. Once the total size exceeds
+    `max_size` bytes, the least recently written files are evicted.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.size = sum(
+            os.path.getsize(path) for path in self._iter_paths()
+        )
+
+    def _iter_paths(self):
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith('.json'):
+                    yield os.path.join(dirpath, filename)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    @staticmethod
+    def get_key(body: Dict[str, Any]) -> str:
+        return hashlib.sha256(
+            json.dumps(body, sort_keys=True).encode()
+        ).hexdigest()
+
+    def get(self, key: str, ttl: Optional[float]) -> Optional[Any]:
+        """Returns the cached response, `ttl=None` never expires"""
+        path = self._get_path(key)
+
+        try:
+            if ttl is not None and time() - os.path.getmtime(path) > ttl:
+                return None
+
+            with open(path) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, response: Any):
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(response, file)
+
+        with self.lock:
+            if os.path.exists(path):
+                self.size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self.size += os.path.getsize(path)
+
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        paths = sorted(self._iter_paths(), key=os.path.getmtime)
+
+        for path in paths:
+            if self.size <= self.max_size * 0.9:
+                break
+
+            self.size -= os.path.getsize(path)
+            os.remove(path)
@@ -1,78 +1,206 @@
-import os
-from time import sleep
-from typing import Generator, cast
+from typing import Any, Dict, Generator, Iterable, List, NamedTuple, Optional, cast
 
-import requests
-
-from customTypes.startgg import (EventSet, StartggEventSetsResponse,
+from customTypes.startgg import (EventSet, SuccessEventSetIdsResponse,
                                  SuccessEventSetsResponse)
-from utils.constants import STARTGG_API_URL
+from queries.adaptivePager import PageSizeLimits, get_adaptive_pages_iter
+from queries.errors import (OfflineCacheMissError, QueryComplexityError,
+                            StartggRequestError)
+from queries.startggClient import startgg_client
+
+from .setsQuery import SET_IDS_QUERY, SETS_QUERY, get_events_sets_query
 
-from .setsQuery import SETS_QUERY
+SETS_PAGE_SIZE = PageSizeLimits(initial=40, minimum=5, maximum=320)
+SET_IDS_PAGE_SIZE = PageSizeLimits(initial=320, minimum=5, maximum=640)
+# Sets nodes requested at once by a batch of small events, no more than the
+# first page of a single event so that batches stay under the complexity cap
+EVENTS_BATCH_MAX_SETS = SETS_PAGE_SIZE.initial
 
 
 def get_event_sets(
     eventId: int,
     page: int,
+    perPage: int,
 ) -> SuccessEventSetsResponse:
-    STARTGG_TOKEN = os.getenv('STARTGG_TOKEN')
-
-    HEADERS = {
-        'Content-Type': 'application/json',
-        'Authorization': f"Bearer {STARTGG_TOKEN}",
-    }
-
-    DEFAULT_PER_PAGE = 40
     BODY = {
         "query": SETS_QUERY,
         "variables": {
             "eventId": eventId,
-            "perPage": DEFAULT_PER_PAGE,
+            "perPage": perPage,
             "page": page,
         }
     }
 
-    retries = 3
+    response = startgg_client.execute(BODY)
+    return cast(SuccessEventSetsResponse, response)
 
-    for attempt in range(retries):
-        BODY['variables']['perPage'] = DEFAULT_PER_PAGE - (attempt * 5)
-        if attempt != 0:
-            sleep(20)
 
-        try:
-            response: StartggEventSetsResponse = requests \
-                .post(STARTGG_API_URL, json=BODY, headers=HEADERS) \
-                .json()
+class EventSetsPage(NamedTuple):
+    sets: List[EventSet]
+    end_offset: int
+    """Number of sets of the event fetched up to this page included"""
+    total: int
 
-            if (response.get('success') is False):
-                raise Exception(response.get('message'))
 
-            if (response.get('errors') is not None):
-                raise Exception(response.get('errors', [])[0]['message'])
+def get_event_sets_pages_iter(
+    eventId: int,
+    start_offset: int = 0,
+    wanted_offsets: Optional[List[int]] = None,
+    checkpoint_total: Optional[int] = None,
+) -> Generator[EventSetsPage, None, None]:
+    """Yields the pages of sets of the event, only the pages containing
+    `wanted_offsets` if given. Starts over from the first page when the
+    total of sets differs from `checkpoint_total`, since the sets before
+    `start_offset` have moved."""
+    responses = get_adaptive_pages_iter(
+        lambda page, perPage: get_event_sets(eventId, page, perPage),
+        lambda response: response['data']['event']['sets'],
+        SETS_PAGE_SIZE,
+        start_offset,
+        wanted_offsets,
+    )
+
+    for response, end_offset in responses:
+        queryComplexity = response['extensions']['queryComplexity']
+        pageInfo = response['data']['event']['sets']['pageInfo']
+        sets = response['data']['event']['sets']['nodes']
+
+        print(f"> Sets {pageInfo = } | {queryComplexity = }")
 
-            return cast(SuccessEventSetsResponse, response)
-        except Exception as e:
-            print(f"Error with request. Retrying ({attempt+1}/{retries})...")
-            print(f"> {e}")
+        if (
+            start_offset > 0
+            and checkpoint_total is not None
+            and pageInfo['total'] != checkpoint_total
+        ):
+            print(
+                f"> Sets of EVENT [{eventId}] changed since the checkpoint "
+                f"({checkpoint_total} -> {pageInfo['total']}), restarting"
+            )
+            yield from get_event_sets_pages_iter(eventId, 0, wanted_offsets)
+            return
 
-    raise RuntimeError("Request failed")
+        yield EventSetsPage(sets, end_offset, pageInfo['total'])
 
 
-def get_event_sets_iter(
+def get_event_set_ids(
     eventId: int,
-) -> Generator[EventSet, None, None]:
-    response = get_event_sets(eventId, 1)
-    totalPages = response['data']['event']['sets']['pageInfo']['totalPages']
+    page: int,
+    perPage: int,
+) -> SuccessEventSetIdsResponse:
+    BODY = {
+        "query": SET_IDS_QUERY,
+        "variables": {
+            "eventId": eventId,
+            "perPage": perPage,
+            "page": page,
+        }
+    }
 
-    for page in range(2, totalPages + 2):
+    response = startgg_client.execute(BODY)
+    return cast(SuccessEventSetIdsResponse, response)
+
+
+def get_event_set_ids_list(eventId: int) -> List[int]:
+    """Ids of the sets of the event, in the order of the sets query"""
+    responses = get_adaptive_pages_iter(
+        lambda page, perPage: get_event_set_ids(eventId, page, perPage),
+        lambda response: response['data']['event']['sets'],
+        SET_IDS_PAGE_SIZE,
+    )
+
+    set_ids: List[int] = []
+    for response, _ in responses:
         queryComplexity = response['extensions']['queryComplexity']
         pageInfo = response['data']['event']['sets']['pageInfo']
-        sets = response['data']['event']['sets']['nodes']
+        print(f"> Set ids {pageInfo = } | {queryComplexity = }")
 
-        print(f"> Sets {pageInfo = } | {queryComplexity = }")
+        set_ids.extend(
+            node['id'] for node in response['data']['event']['sets']['nodes']
+        )
+
+    return set_ids
+
+
+def get_batched_per_page(num_entrants: int) -> Optional[int]:
+    """perPage expected to hold every set of an event in one page, `None`
+    if the event is too big to share a request with others"""
+    # Double elimination brackets have about two sets per entrant
+    estimated_sets = 2 * num_entrants
+
+    per_page = SETS_PAGE_SIZE.minimum
+    while per_page < estimated_sets:
+        per_page *= 2
 
-        for event_set in sets:
-            yield event_set
+    return per_page if per_page <= EVENTS_BATCH_MAX_SETS // 2 else None
 
-        if (page != totalPages + 1):
-            response = get_event_sets(eventId, page)
+
+def get_events_sets(per_pages: Dict[int, int]) -> Any:
+    event_ids = list(per_pages)
+    variables: Dict[str, int] = {}
+    for i, event_id in enumerate(event_ids):
+        variables[f"eventId{i}"] = event_id
+        variables[f"perPage{i}"] = per_pages[event_id]
+
+    BODY = {
+        "query": get_events_sets_query(len(event_ids)),
+        "variables": variables,
+    }
+
+    return startgg_client.execute(BODY)
+
+
+def get_following_sets_pages_iter(
+    eventId: int,
+    first_page: EventSetsPage,
+) -> Generator[EventSetsPage, None, None]:
+    yield first_page
+
+    if first_page.end_offset < first_page.total:
+        yield from get_event_sets_pages_iter(eventId, first_page.end_offset)
+
+
+def get_events_sets_pages_iters(
+    per_pages: Dict[int, int],
+) -> List[Iterable[EventSetsPage]]:
+    """Fetches the first page of sets of several events in a single request,
+    one alias per event, the following pages are fetched per event.
+
+    Batches rejected for their complexity are split in two. On any other
+    error the events are fetched one by one, so that the error is raised
+    by the pages of each of them.
+    """
+    try:
+        response = get_events_sets(per_pages)
+    except (QueryComplexityError, OfflineCacheMissError):
+        # Offline, a missing batch is one the cached run had to split
+        if len(per_pages) == 1:
+            return [get_event_sets_pages_iter(next(iter(per_pages)))]
+
+        event_ids = list(per_pages)
+        middle = len(event_ids) // 2
+        return [
+            *get_events_sets_pages_iters(
+                {event_id: per_pages[event_id] for event_id in event_ids[:middle]}
+            ),
+            *get_events_sets_pages_iters(
+                {event_id: per_pages[event_id] for event_id in event_ids[middle:]}
+            ),
+        ]
+    except StartggRequestError as e:
+        print(f"> Batched sets request failed, fetching events one by one : {e}")
+        return [get_event_sets_pages_iter(event_id) for event_id in per_pages]
+
+    queryComplexity = response['extensions']['queryComplexity']
+    print(f"> Sets of {len(per_pages)} events | {queryComplexity = }")
+
+    events_pages: List[Iterable[EventSetsPage]] = []
+    for i, event_id in enumerate(per_pages):
+        event = response['data'][f"e{i}"]
+        sets = event['sets'] if event is not None else None
+
+        first_page = EventSetsPage(
+            sets['nodes'], len(sets['nodes']), sets['pageInfo']['total']
+        ) if sets is not None else EventSetsPage([], 0, 0)
+
+        events_pages.append(get_following_sets_pages_iter(event_id, first_page))
+
+    return events_pages
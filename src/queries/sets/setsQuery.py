@@ -43,3 +43,90 @@ query EventsQuery(
   }
 }
 """
+
+# Same ordering and filters as SETS_QUERY, so that offsets match
+SET_IDS_QUERY = """
+query EventSetIdsQuery(
+  $eventId: ID,
+  $perPage: Int,
+  $page: Int
+) {
+  event(id: $eventId) {
+    sets(
+      page: $page,
+      perPage: $perPage,
+      sortType: RECENT,
+      filters: {hideEmpty: true}
+    ) {
+      pageInfo {
+        total
+        totalPages
+        page
+        perPage
+      }
+      nodes {
+        id
+      }
+    }
+  }
+}
+"""
+
+SET_NODE_FRAGMENT = """
+fragment SetNode on Set {
+  id
+  slots {
+    entrant {
+      id
+      initialSeedNum
+      participants {
+        player {
+          id
+          gamerTag
+        }
+      }
+    }
+    standing {
+      stats {
+        score {
+          value
+        }
+      }
+    }
+  }
+}
+"""
+
+
+def get_events_sets_query(event_count: int) -> str:
+    """First page of sets of `event_count` events, aliased `e0`, `e1`...
+    with variables `$eventId0`, `$perPage0`..."""
+    variables = ",\n".join(
+        f"  $eventId{i}: ID,\n  $perPage{i}: Int" for i in range(event_count)
+    )
+    events = "\n".join(f"""  e{i}: event(id: $eventId{i}) {{
+    sets(
+      page: 1,
+      perPage: $perPage{i},
+      sortType: RECENT,
+      filters: {{hideEmpty: true}}
+    ) {{
+      pageInfo {{
+        total
+        totalPages
+        page
+        perPage
+      }}
+      nodes {{
+        ...SetNode
+      }}
+    }}
+  }}""" for i in range(event_count))
+
+    return f"""
+query EventsSetsQuery(
+{variables}
+) {{
+{events}
+}}
+{SET_NODE_FRAGMENT}"""
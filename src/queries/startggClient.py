@@ -0,0 +1,195 @@
+import random
+import threading
+from time import sleep
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.constants import (STARTGG_API_URL, STARTGG_BACKOFF_BASE,
+                             STARTGG_BACKOFF_MAX, STARTGG_MAX_ATTEMPTS,
+                             STARTGG_REQUEST_TIMEOUT)
+from utils.metrics import metrics
+
+from .errors import (OfflineCacheMissError, PermanentRequestError,
+                     RateLimitError, StartggRequestError,
+                     TransientRequestError, get_message_error)
+from .responseCache import ResponseCache
+from .tokenPool import ApiToken, TokenPool
+
+DEFAULT_POOL_SIZE = 10
+
+
+def get_retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(
+        0, min(STARTGG_BACKOFF_MAX, STARTGG_BACKOFF_BASE * 2 ** attempt)
+    )
+
+
+class StartggClient:
+    """GraphQL transport shared by every start.gg query.
+
+    Keeps a pooled `requests.Session` so that connections to the API are
+    reused across pages, and spreads requests over the pool of API tokens.
+    Successful responses are stored in the optional response cache, which
+    is the only source of data in offline mode.
+
+    Failures are raised as `StartggRequestError`: transient ones (rate
+    limits, 5xx, connection errors) are retried with exponential backoff
+    first, permanent ones (GraphQL errors) are raised right away.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+        self.set_pool_size(pool_size)
+        self.response_cache: Optional[ResponseCache] = None
+        self.offline = False
+        self.token_pool: Optional[TokenPool] = None
+        self.token_pool_lock = threading.Lock()
+
+    def set_pool_size(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+
+    def set_response_cache(
+        self,
+        response_cache: Optional[ResponseCache],
+        offline: bool = False,
+    ):
+        if offline and response_cache is None:
+            raise ValueError("Offline mode requires a response cache")
+
+        self.response_cache = response_cache
+        self.offline = offline
+
+    def load_tokens(self):
+        self.token_pool = TokenPool.from_env()
+
+    def execute(
+        self,
+        body: Dict[str, Any],
+        cache_ttl: Optional[float] = None,
+    ) -> Any:
+        """Sends `body` to the API, cached responses expire after `cache_ttl`
+        seconds (never when None)"""
+        cache_key = ResponseCache.get_key(body)
+
+        if self.response_cache is not None:
+            # Replays use whatever was cached, however old
+            response = self.response_cache.get(
+                cache_key, None if self.offline else cache_ttl
+            )
+            if response is not None:
+                metrics.inc('startgg_cache_hits_total')
+                return response
+
+        if self.offline:
+            raise OfflineCacheMissError(
+                f"No cached response for {body['variables']}"
+            )
+
+        for attempt in range(STARTGG_MAX_ATTEMPTS):
+            try:
+                response = self.send(body)
+                break
+            except TransientRequestError as e:
+                if attempt == STARTGG_MAX_ATTEMPTS - 1:
+                    raise
+
+                # Rate limited tokens are quarantined by the token pool,
+                # which already waits for one to be available
+                delay = (
+                    0 if isinstance(e, RateLimitError)
+                    else get_backoff_delay(attempt)
+                )
+
+                print(f"Error with request. Retrying in {delay:.1f}s ({attempt+1}/{STARTGG_MAX_ATTEMPTS})...")
+                print(f"> {e}")
+                metrics.inc('startgg_retries_total', error=type(e).__name__)
+                metrics.inc('startgg_sleep_seconds_total', delay, reason='backoff')
+                sleep(delay)
+
+        if self.response_cache is not None:
+            self.response_cache.put(cache_key, response)
+
+        return response
+
+    def send(self, body: Dict[str, Any]) -> Any:
+        """Sends a single request with the next available token, raising
+        classified errors"""
+        if self.token_pool is None:
+            # Loaded on the first request, which may come from several
+            # discovery threads at once
+            with self.token_pool_lock:
+                if self.token_pool is None:
+                    self.load_tokens()
+        assert self.token_pool is not None
+
+        token = self.token_pool.acquire()
+        try:
+            with metrics.time('startgg_request_seconds'):
+                response = self.send_with_token(body, token)
+        except RateLimitError as e:
+            metrics.inc('startgg_requests_total', status=type(e).__name__)
+            self.token_pool.quarantine(token, e.retry_after)
+            raise
+        except StartggRequestError as e:
+            metrics.inc('startgg_requests_total', status=type(e).__name__)
+            raise
+
+        metrics.inc('startgg_requests_total', status='success')
+        metrics.inc(
+            'startgg_query_complexity_total',
+            response.get('extensions', {}).get('queryComplexity', 0),
+        )
+        return response
+
+    def send_with_token(self, body: Dict[str, Any], token: ApiToken) -> Any:
+        try:
+            http_response = self.session.post(
+                STARTGG_API_URL,
+                json=body,
+                headers={'Authorization': f"Bearer {token.value}"},
+                timeout=STARTGG_REQUEST_TIMEOUT,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise TransientRequestError(str(e))
+
+        if http_response.status_code == 429:
+            raise RateLimitError(
+                "HTTP 429 Too Many Requests",
+                get_retry_after(http_response),
+            )
+        if http_response.status_code >= 500:
+            raise TransientRequestError(f"HTTP {http_response.status_code}")
+
+        try:
+            response = http_response.json()
+        except ValueError:
+            message = f"Invalid JSON response (HTTP {http_response.status_code})"
+            if http_response.status_code >= 400:
+                raise PermanentRequestError(message)
+            raise TransientRequestError(message)
+
+        if (response.get('success') is False):
+            raise get_message_error(str(response.get('message')))
+
+        if (response.get('errors') is not None):
+            raise get_message_error(response['errors'][0]['message'])
+
+        return response
+
+
+startgg_client = StartggClient()
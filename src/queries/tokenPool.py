@@ -0,0 +1,84 @@
+import os
+import threading
+from time import monotonic, sleep
+from typing import List, Optional
+
+from utils.constants import (STARTGG_RATE_LIMIT_REQUESTS,
+                             STARTGG_RATE_LIMIT_WINDOW,
+                             STARTGG_TOKEN_QUARANTINE)
+from utils.metrics import metrics
+from utils.rateLimiter import RateLimiter
+
+
+class ApiToken:
+    def __init__(self, value: str):
+        self.value = value
+        self.rate_limiter = RateLimiter(
+            STARTGG_RATE_LIMIT_REQUESTS,
+            STARTGG_RATE_LIMIT_WINDOW,
+        )
+        self.quarantined_until = 0.0
+
+    def __repr__(self) -> str:
+        return f"ApiToken(...{self.value[-4:]})"
+
+
+class TokenPool:
+    """Schedules requests round-robin across several API tokens.
+
+    Each token has its own rate limiter budget, and a token that got rate
+    limited is left aside until its quarantine ends.
+    """
+
+    def __init__(self, values: List[str]):
+        if not values:
+            raise Exception("STARTGG_TOKENS or STARTGG_TOKEN is missing")
+
+        self.tokens = [ApiToken(value) for value in values]
+        self.next_index = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TokenPool":
+        STARTGG_TOKENS = os.getenv('STARTGG_TOKENS') or os.getenv('STARTGG_TOKEN')
+        return cls([
+            token.strip() for token in (STARTGG_TOKENS or '').split(',')
+            if token.strip()
+        ])
+
+    def _next_token(self) -> Optional[ApiToken]:
+        now = monotonic()
+
+        with self.lock:
+            for _ in range(len(self.tokens)):
+                token = self.tokens[self.next_index]
+                self.next_index = (self.next_index + 1) % len(self.tokens)
+
+                if token.quarantined_until <= now:
+                    return token
+
+        return None
+
+    def acquire(self) -> ApiToken:
+        """Returns the next available token once its budget allows a
+        request, waiting for a quarantine to end if they all are"""
+        token = self._next_token()
+
+        while token is None:
+            wait = max(0, min(
+                token.quarantined_until for token in self.tokens
+            ) - monotonic())
+            metrics.inc('startgg_sleep_seconds_total', wait, reason='quarantine')
+            sleep(wait)
+            token = self._next_token()
+
+        slept = token.rate_limiter.acquire()
+        if slept:
+            metrics.inc('startgg_sleep_seconds_total', slept, reason='rate_limit')
+        return token
+
+    def quarantine(self, token: ApiToken, duration: Optional[float] = None):
+        token.quarantined_until = (
+            monotonic() + (duration or STARTGG_TOKEN_QUARANTINE)
+        )
+        print(f"> {token} rate limited, quarantined for {duration or STARTGG_TOKEN_QUARANTINE}s")
@@ -1,43 +1,46 @@
-import os
 from datetime import datetime, timezone
-from time import sleep
-from typing import Generator, TypedDict, cast
-
-import requests
-
-from customTypes.startgg import (StartggTournamentsResponse,
-                                 SuccessTournamentsResponse)
-from models import EventDB, TournamentDB
-from utils.constants import STARTGG_API_URL
+from typing import Generator, List, Set, TypedDict, cast
+
+from customTypes.startgg import (Event, SuccessTournamentsResponse,
+                                 Tournament)
+from models import ActivityState, EventDB, TournamentDB
+from queries.adaptivePager import PageSizeLimits, get_adaptive_pages_iter
+from queries.startggClient import startgg_client
+from utils.constants import (STARTGG_SINGLES_EVENT_TYPE,
+                             TOURNAMENTS_CACHE_TTL,
+                             TOURNAMENTS_WINDOW_MAX_TOTAL)
+from utils.datePartitions import (DAY, get_date_partitions,
+                                  split_date_window)
+from utils.prefetch import prefetch_iter
+from utils.shouldSkipEvent import get_blacklist_pattern
 
 from .tournamentsQuery import TOURNAMENTS_QUERY
 
+TOURNAMENTS_PAGE_SIZE = PageSizeLimits(initial=160, minimum=5, maximum=640)
+
 
 class GetTournamentsParameters(TypedDict):
     afterDate: int
     beforeDate: int
     countryCode: str
     addrState: str
+    minEntrants: int
+    videogameIds: List[int]
 
 
 def get_tournaments(
     params: GetTournamentsParameters,
     page: int,
+    perPage: int,
 ) -> SuccessTournamentsResponse:
-    STARTGG_TOKEN = os.getenv('STARTGG_TOKEN')
-
-    HEADERS = {
-        'Content-Type': 'application/json',
-        'Authorization': f"Bearer {STARTGG_TOKEN}",
-    }
-
-    DEFAULT_PER_PAGE = 90
     BODY = {
         "query": TOURNAMENTS_QUERY,
         "variables": {
             "afterDate": params["afterDate"],
             "beforeDate": params["beforeDate"],
-            "perPage": DEFAULT_PER_PAGE,
+            "videogameIds": params["videogameIds"],
+            "eventTypes": [STARTGG_SINGLES_EVENT_TYPE],
+            "perPage": perPage,
             "page": page,
         }
     }
@@ -47,67 +50,144 @@ def get_tournaments(
     if params['addrState']:
         BODY['variables']['addrState'] = params['addrState']
 
-    retries = 3
+    response = startgg_client.execute(BODY, cache_ttl=TOURNAMENTS_CACHE_TTL)
+    return cast(SuccessTournamentsResponse, response)
 
-    for attempt in range(retries):
-        BODY['variables']['perPage'] = DEFAULT_PER_PAGE - (attempt * 10)
-        if attempt != 0:
-            sleep(20)
 
-        try:
-            response: StartggTournamentsResponse = requests \
-                .post(STARTGG_API_URL, json=BODY, headers=HEADERS) \
-                .json()
+def get_event_db(event: Event) -> EventDB:
+    # Decided from the raw slug, so the blacklist is never evaluated again
+    blacklist_pattern = get_blacklist_pattern(event['slug'])
 
-            if (response.get('success') is False):
-                raise Exception(response.get('message'))
+    return EventDB(
+        id=event['id'],
+        name=event['name'],
+        num_entrants=event['numEntrants'] or 0,
+        slug=event['slug'],
+        start_at=datetime.fromtimestamp(event['startAt'], tz=timezone.utc),
+        state=ActivityState[event['state']],
+        videogame_id=event['videogame']['id'],
+        blacklisted=blacklist_pattern is not None,
+        blacklist_pattern=blacklist_pattern,
+    )
 
-            if (response.get('errors') is not None):
-                raise Exception(response.get('errors', [])[0]['message'])
 
-            return cast(SuccessTournamentsResponse, response)
-        except Exception as e:
-            print(f"Error with request. Retrying ({attempt+1}/{retries})...")
-            print(f"> {e}")
-
-    raise RuntimeError("Request failed")
-
-
-def get_tournaments_iter(
+def get_importable_events(
+    events: List[Event],
+    params: GetTournamentsParameters,
+) -> List[Event]:
+    """Prunes the events the API can't filter out, which would never be
+    imported. Blacklisted events are kept to record their decision."""
+    return [
+        event for event in events
+        if event['state'] == ActivityState.COMPLETED.name and
+        (event['numEntrants'] or 0) >= params['minEntrants']
+    ]
+
+
+def get_tournament_db(
+    tournament: Tournament,
+    params: GetTournamentsParameters,
+) -> TournamentDB:
+    return TournamentDB(
+        id=tournament['id'],
+        name=tournament['name'],
+        url=tournament['url'],
+        city=tournament['city'],
+        country_code=tournament['countryCode'],
+        addr_state=tournament['addrState'],
+        start_at=(
+            datetime
+            .fromtimestamp(tournament['startAt'], tz=timezone.utc)
+        ),
+        events=[
+            get_event_db(event) for event in
+            get_importable_events(tournament['events'] or [], params)
+        ]
+    )
+
+
+def get_window_tournaments_iter(
     params: GetTournamentsParameters
 ) -> Generator[TournamentDB, None, None]:
-    response = get_tournaments(params, 1)
-    totalPages = response['data']['tournaments']['pageInfo']['totalPages']
-
-    for page in range(2, totalPages + 2):
+    """Lists the tournaments of the date window of `params`, split in
+    smaller windows listed one after the other while it has too many
+    tournaments to be paginated through"""
+    responses = get_adaptive_pages_iter(
+        lambda page, perPage: get_tournaments(params, page, perPage),
+        lambda response: response['data']['tournaments'],
+        TOURNAMENTS_PAGE_SIZE,
+    )
+
+    for response, end_offset in responses:
         queryComplexity = response['extensions']['queryComplexity']
         pageInfo = response['data']['tournaments']['pageInfo']
         tournaments = response['data']['tournaments']['nodes']
 
+        if (
+            end_offset == len(tournaments) and
+            pageInfo['total'] > TOURNAMENTS_WINDOW_MAX_TOTAL
+        ):
+            windows = split_date_window(
+                params['afterDate'], params['beforeDate']
+            )
+
+            if len(windows) > 1:
+                responses.close()
+                print(
+                    f"> {pageInfo['total']} tournaments, splitting the date "
+                    f"window into {len(windows)}"
+                )
+                for after_date, before_date in windows:
+                    yield from get_window_tournaments_iter({
+                        **params,
+                        'afterDate': after_date,
+                        'beforeDate': before_date,
+                    })
+                return
+
         print(f"> Tournaments {pageInfo = } | {queryComplexity = }")
 
         for tournament in tournaments:
-            yield TournamentDB(
-                id=tournament['id'],
-                name=tournament['name'],
-                url=tournament['url'],
-                city=tournament['city'],
-                country_code=tournament['countryCode'],
-                addr_state=tournament['addrState'],
-                events=[
-                    EventDB(
-                        id=event['id'],
-                        name=event['name'],
-                        num_entrants=event['numEntrants'] or 0,
-                        slug=event['slug'],
-                        start_at=(
-                            datetime
-                            .fromtimestamp(event['startAt'], tz=timezone.utc)
-                        ),
-                        state=event['state'],
-                    ) for event in tournament['events']
-                ]
+            yield get_tournament_db(tournament, params)
+
+
+def get_tournaments_iter(
+    params: GetTournamentsParameters,
+    concurrency: int = 1,
+) -> Generator[TournamentDB, None, None]:
+    """Lists the tournaments once each, in startAt order. With more than
+    one thread, the months of the date range are listed in parallel."""
+    if concurrency <= 1:
+        windows_tournaments = [get_window_tournaments_iter(params)]
+    else:
+        months = get_date_partitions(
+            params['afterDate'], params['beforeDate'], 'month'
+        )
+        windows_tournaments = (
+            future.result() for _, future in prefetch_iter(
+                [
+                    (
+                        max(params['afterDate'], month_start),
+                        min(params['beforeDate'], month_end + DAY),
+                    )
+                    for month_start, month_end in months
+                ],
+                lambda window: window,
+                lambda window: list(get_window_tournaments_iter({
+                    **params,
+                    'afterDate': window[0],
+                    'beforeDate': window[1],
+                })),
+                concurrency,
             )
+        )
+
+    # Consecutive windows share their bound
+    seen_tournament_ids: Set[int] = set()
+    for window_tournaments in windows_tournaments:
+        for tournament in window_tournaments:
+            if tournament.id in seen_tournament_ids:
+                continue
 
-        if (page != totalPages + 1):
-            response = get_tournaments(params, page)
+            seen_tournament_ids.add(tournament.id)
+            yield tournament
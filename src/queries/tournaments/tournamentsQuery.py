@@ -4,6 +4,8 @@ query TournamentsQuery(
   $beforeDate: Timestamp,
   $countryCode: String,
   $addrState: String,
+  $videogameIds: [ID],
+  $eventTypes: [Int],
   $perPage: Int,
   $page: Int
 ) {
@@ -14,7 +16,7 @@ query TournamentsQuery(
       page: $page,
       filter: {
         past: true,
-        videogameIds: [1386],
+        videogameIds: $videogameIds,
         countryCode: $countryCode,
         addrState: $addrState,
         afterDate: $afterDate,
@@ -36,7 +38,14 @@ query TournamentsQuery(
       city
       countryCode
       addrState
-      events(filter: {videogameId: [1386], published: true}) {
+      startAt
+      events(
+        filter: {
+          videogameId: $videogameIds,
+          published: true,
+          type: $eventTypes
+        }
+      ) {
         id
         name
         numEntrants
@@ -45,7 +54,6 @@ query TournamentsQuery(
         state
         videogame {
           id
-          name
         }
       }
     }
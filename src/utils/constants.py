@@ -1,3 +1,40 @@
 STARTGG_BASE_URL = "https://www.start.gg"
 
 STARTGG_API_URL = "https://api.start.gg/gql/alpha"
+
+# Super Smash Bros. Ultimate, imported by default
+STARTGG_ULTIMATE_VIDEOGAME_ID = 1386
+
+# start.gg allows 80 requests per 60 seconds per token
+STARTGG_RATE_LIMIT_WINDOW = 60
+STARTGG_RATE_LIMIT_REQUESTS = 80
+
+# Tournament listings may still change, sets of COMPLETED events never expire
+TOURNAMENTS_CACHE_TTL = 60 * 60
+
+# start.gg rejects requests returning more than 1000 objects
+STARTGG_MAX_QUERY_COMPLEXITY = 1000
+
+# Retries of transient start.gg errors, with exponential backoff and jitter
+STARTGG_MAX_ATTEMPTS = 6
+STARTGG_BACKOFF_BASE = 2
+STARTGG_BACKOFF_MAX = 120
+# (connect, read) seconds before a stalled request is retried
+STARTGG_REQUEST_TIMEOUT = (10, 60)
+
+# Seconds a rate limited token is left unused, unless told by Retry-After
+STARTGG_TOKEN_QUARANTINE = 60
+
+# Seconds an import job stays leased to a worker without a heartbeat
+IMPORT_JOB_LEASE = 5 * 60
+# Claims of a job before it is marked FAILED, so a crashing event can't
+# take down every worker in turn
+IMPORT_JOB_MAX_ATTEMPTS = 5
+
+# Event `type` of events with one participant per entrant, team events
+# (2v2, squad strike...) are filtered out by the tournaments query
+STARTGG_SINGLES_EVENT_TYPE = 1
+
+# start.gg can't paginate through more than 10000 nodes, date windows
+# with more tournaments than this are split
+TOURNAMENTS_WINDOW_MAX_TOTAL = 5000
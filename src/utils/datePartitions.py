@@ -0,0 +1,88 @@
+import datetime
+import math
+from typing import List, Tuple
+
+DAY = 24 * 60 * 60
+
+
+def get_date_partitions(
+    start_timestamp: int,
+    end_timestamp: int,
+    partitions: str,
+) -> List[Tuple[int, int]]:
+    """Splits the days of [start, end] into non-overlapping inclusive day
+    ranges, either by calendar `month` or into N equal ranges.
+
+    Returns the (start, end) timestamps of each range at 00:00 UTC.
+    """
+    start = datetime.datetime.fromtimestamp(
+        start_timestamp, tz=datetime.timezone.utc
+    ).date()
+    end = datetime.datetime.fromtimestamp(
+        end_timestamp, tz=datetime.timezone.utc
+    ).date()
+
+    date_ranges: List[Tuple[datetime.date, datetime.date]] = []
+
+    if partitions == 'month':
+        range_start = start
+        while range_start <= end:
+            next_month = (
+                range_start.replace(day=1) + datetime.timedelta(days=32)
+            ).replace(day=1)
+            range_end = min(end, next_month - datetime.timedelta(days=1))
+            date_ranges.append((range_start, range_end))
+            range_start = next_month
+    else:
+        days = (end - start).days + 1
+        count = max(1, min(int(partitions), days))
+        for i in range(count):
+            date_ranges.append((
+                start + datetime.timedelta(days=days * i // count),
+                start + datetime.timedelta(days=days * (i + 1) // count - 1),
+            ))
+
+    def to_timestamp(date: datetime.date) -> int:
+        return int(
+            datetime.datetime
+            .combine(date, datetime.time(), tzinfo=datetime.timezone.utc)
+            .timestamp()
+        )
+
+    return [
+        (to_timestamp(range_start), to_timestamp(range_end))
+        for range_start, range_end in date_ranges
+    ]
+
+
+def split_date_window(
+    start_timestamp: int,
+    end_timestamp: int,
+) -> List[Tuple[int, int]]:
+    """Splits [start, end] by calendar month, else by week, else by day,
+    else in two halves. Consecutive windows share their bound.
+
+    Returns [(start, end)] when the window is too small to be split.
+    """
+    span = end_timestamp - start_timestamp
+
+    if span > 31 * DAY:
+        partitions = 'month'
+    elif span > 7 * DAY:
+        partitions = str(math.ceil(span / (7 * DAY)))
+    elif span > DAY:
+        partitions = str(math.ceil(span / DAY))
+    elif span > 60 * 60:
+        middle = start_timestamp + span // 2
+        return [(start_timestamp, middle), (middle, end_timestamp)]
+    else:
+        return [(start_timestamp, end_timestamp)]
+
+    windows = [
+        (max(start_timestamp, range_start),
+         min(end_timestamp, range_end + DAY))
+        for range_start, range_end in get_date_partitions(
+            start_timestamp, end_timestamp, partitions
+        )
+    ]
+    return [(start, end) for start, end in windows if start < end]
@@ -0,0 +1,44 @@
+import argparse
+import json
+import os
+from typing import Dict
+
+from utils.constants import STARTGG_ULTIMATE_VIDEOGAME_ID
+from utils.path import ROOT_DIR, upsert_dir
+
+WATERMARKS_DIR = "output/watermarks"
+
+
+def get_watermark_path(args: argparse.Namespace) -> str:
+    """One watermark file per filter combination of the export"""
+    filename = (
+        f"{args.countryCode}-{args.addrState}-"
+        f"{args.startDate}-{args.endDate}"
+    )
+    # Exports of the default game keep the watermark files they had
+    if sorted(set(args.videogame)) != [STARTGG_ULTIMATE_VIDEOGAME_ID]:
+        filename += '-' + '-'.join(
+            str(id) for id in sorted(set(args.videogame))
+        )
+    filename += '.json'
+    return os.path.join(ROOT_DIR, WATERMARKS_DIR, filename)
+
+
+def load_watermark(args: argparse.Namespace) -> Dict[str, int]:
+    """Returns `import_xmin`, the sets of transactions before it were
+    already exported with the filters of `args`. Watermarks written before
+    hold `last_set_id` instead."""
+    try:
+        with open(get_watermark_path(args)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_watermark(args: argparse.Namespace, import_xmin: int):
+    upsert_dir(WATERMARKS_DIR)
+
+    path = get_watermark_path(args)
+    with open(f"{path}.tmp", 'w') as file:
+        json.dump({'import_xmin': import_xmin}, file)
+    os.replace(f"{path}.tmp", path)
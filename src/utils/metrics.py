@@ -0,0 +1,188 @@
+import json
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Seconds, from a cached DB query to a long rate limit wait
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+HISTOGRAM_BUCKETS: Dict[str, Sequence[float]] = {
+    'event_sets_per_second': (1, 5, 10, 25, 50, 100, 250, 500, 1000),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """Thread-safe counters and histograms of the current run.
+
+    Every metric is written to the Prometheus endpoint if started, and
+    to the JSON-lines file, if any, when the run ends. `log` also appends
+    one-off records, like the summary of each imported event, to that
+    file.
+    """
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.lock = threading.Lock()
+        self.file_path: Optional[str] = None
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(
+                    HISTOGRAM_BUCKETS.get(name, DEFAULT_BUCKETS)
+                )
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Generator[None, None, None]:
+        """Observes the seconds spent in the block, even if it raises"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def log(self, record_type: str, **fields: Any):
+        if self.file_path is None:
+            return
+
+        record = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'type': record_type,
+            **fields,
+        }
+        with self.lock:
+            with open(self.file_path, 'a') as file:
+                file.write(json.dumps(record) + '\n')
+
+    def log_snapshot(self):
+        with self.lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in self.counters.items()
+            ]
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': dict(zip(
+                        [*map(str, histogram.buckets), '+Inf'],
+                        histogram.counts,
+                    )),
+                }
+                for (name, labels), histogram in self.histograms.items()
+            ]
+
+        self.log('snapshot', counters=counters, histograms=histograms)
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def format_labels(labels: Labels, *extra: Tuple[str, str]) -> str:
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ''
+            return '{' + ','.join(
+                f'{key}="{value}"' for key, value in pairs
+            ) + '}'
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for (name, labels), histogram in sorted(
+                self.histograms.items(), key=lambda item: item[0]
+            ):
+                cumulative = 0
+                for bound, count in zip(
+                    [*map(str, histogram.buckets), '+Inf'], histogram.counts
+                ):
+                    cumulative += count
+                    lines.append(
+                        f"{name}_bucket"
+                        f"{format_labels(labels, ('le', bound))} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(
+                    f"{name}_count{format_labels(labels)} {histogram.count}"
+                )
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def start_metrics_server(port: int):
+    """Serves the metrics in the Prometheus text format on `/metrics`"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+
+            body = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"> Serving metrics on http://localhost:{port}/metrics")
+
+
+def instrument_engine(engine: Engine):
+    """Counts and times every query sent by the engine"""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['query_start'].pop()
+        metrics.observe('db_query_seconds', perf_counter() - start)
+
+
+class InstrumentedSession(Session):
+    def commit(self):
+        with metrics.time('db_commit_seconds'):
+            super().commit()
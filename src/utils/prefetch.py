@@ -0,0 +1,40 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Generator, Iterable, Tuple, TypeVar
+
+T = TypeVar('T')
+K = TypeVar('K')
+R = TypeVar('R')
+
+
+def prefetch_iter(
+    items: Iterable[T],
+    get_key: Callable[[T], K],
+    fetch: Callable[[K], R],
+    concurrency: int,
+) -> Generator[Tuple[T, Future[R]], None, None]:
+    """Runs `fetch` on up to `concurrency` items ahead in worker threads.
+
+    `items` and `get_key` are only consumed from the calling thread, so
+    they may touch the database session; `fetch` only receives the key.
+    Futures are yielded in the order of `items` once done, so a failed
+    fetch only raises when its result is read.
+    """
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending: Deque[Tuple[T, Future[R]]] = deque()
+
+    try:
+        for item in items:
+            pending.append((item, executor.submit(fetch, get_key(item))))
+
+            if len(pending) > concurrency:
+                item, future = pending.popleft()
+                wait([future])
+                yield item, future
+
+        while pending:
+            item, future = pending.popleft()
+            wait([future])
+            yield item, future
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
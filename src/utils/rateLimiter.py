@@ -0,0 +1,38 @@
+import threading
+from collections import deque
+from time import monotonic, sleep
+from typing import Deque
+
+
+class RateLimiter:
+    """Thread-safe sliding-window log of the requests sent.
+
+    `acquire` is called before each request and blocks until fewer than
+    `max_requests` were sent during the last `window` seconds, so that no
+    window, wherever it starts, ever holds more requests than allowed.
+    """
+
+    def __init__(self, max_requests: int, window: float):
+        self.max_requests = max_requests
+        self.window = window
+        self.sent_at: Deque[float] = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a request can be sent, returns the time slept"""
+        slept = 0.0
+
+        while True:
+            with self.lock:
+                now = monotonic()
+                while self.sent_at and self.sent_at[0] <= now - self.window:
+                    self.sent_at.popleft()
+
+                if len(self.sent_at) < self.max_requests:
+                    self.sent_at.append(now)
+                    return slept
+
+                wait = self.sent_at[0] + self.window - now
+
+            sleep(wait)
+            slept += wait
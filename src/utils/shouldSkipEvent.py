@@ -1,6 +1,8 @@
 import re
+from typing import Iterable, List, Optional, Tuple
 
 from models import ActivityState, EventDB
+from utils.lruCache import LRUCache
 
 BLACKLISTED_PATTERNS = [
     r'side-event',
@@ -21,10 +23,117 @@ BLACKLISTED_PATTERNS = [
 ]
 
 
+# Inline flags like `(?i)` are only allowed at the start of a whole regex
+INLINE_FLAGS_REGEX = re.compile(r'^\(\?([aiLmsux]+)\)')
+
+
+def compile_blacklist_pattern(pattern: str) -> re.Pattern:
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid blacklist pattern {pattern!r}: {e}") from e
+
+
+def get_scoped_pattern(pattern: str) -> str:
+    """Rewrites the leading inline flags of the pattern to a group scoped
+    to the pattern, like `(?i)abc` to `(?i:abc)`"""
+    match = INLINE_FLAGS_REGEX.match(pattern)
+    if match is None:
+        return pattern
+
+    scoped_pattern = f"(?{match.group(1)}:{pattern[match.end():]})"
+    compile_blacklist_pattern(scoped_pattern)
+    return scoped_pattern
+
+
+class EventBlacklist:
+    """Patterns compiled into a single regex, one named group per pattern
+    so that the matched one can be told apart. Patterns with groups of
+    their own, whose backreferences would point to other groups, are
+    searched separately after it."""
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+
+        combined_patterns: List[Tuple[int, str]] = []
+        self.grouped_regexes: List[Tuple[int, re.Pattern]] = []
+        for index, pattern in enumerate(patterns):
+            regex = compile_blacklist_pattern(pattern)
+            if regex.groups:
+                self.grouped_regexes.append((index, regex))
+            else:
+                combined_patterns.append((index, get_scoped_pattern(pattern)))
+
+        self.regex = re.compile('|'.join(
+            f"(?P<p{index}>{pattern})" for index, pattern in combined_patterns
+        )) if combined_patterns else None
+        # Event names like `singles` come back for most tournaments
+        self.decisions: LRUCache[str, str] = LRUCache(4096)
+
+    def search(self, event_name: str) -> Optional[str]:
+        match = self.regex.search(event_name) if self.regex else None
+        if match is not None and match.lastgroup is not None:
+            return self.patterns[int(match.lastgroup[1:])]
+
+        for index, regex in self.grouped_regexes:
+            if regex.search(event_name):
+                return self.patterns[index]
+
+        return None
+
+    def get_matched_pattern(self, event_slug: str) -> Optional[str]:
+        """Returns the first blacklisted pattern found in the last part of
+        the event slug"""
+        event_name = event_slug.split('/')[-1]
+
+        decision = self.decisions.get(event_name)
+        if decision is None:
+            decision = self.search(event_name) or ''
+            self.decisions.put(event_name, decision)
+
+        return decision or None
+
+
+event_blacklist = EventBlacklist(BLACKLISTED_PATTERNS)
+
+
+def load_event_blacklist(
+    patterns_file: Optional[str] = None,
+    extra_patterns: Iterable[str] = (),
+):
+    """Adds the patterns of a file, one per line with `#` comments, and
+    `extra_patterns` to the default ones"""
+    global event_blacklist
+
+    patterns = list(BLACKLISTED_PATTERNS)
+    if patterns_file:
+        with open(patterns_file) as file:
+            patterns.extend(
+                line.strip() for line in file
+                if line.strip() and not line.strip().startswith('#')
+            )
+    patterns.extend(extra_patterns)
+
+    event_blacklist = EventBlacklist(patterns)
+
+
+def get_blacklist_pattern(event_slug: str) -> Optional[str]:
+    return event_blacklist.get_matched_pattern(event_slug)
+
+
+def decide_event_blacklist(event: EventDB):
+    """Records on the event whether it is blacklisted, decided only once"""
+    if event.blacklisted is not None:
+        return
+
+    event.blacklist_pattern = get_blacklist_pattern(event.slug)
+    event.blacklisted = event.blacklist_pattern is not None
+
+
 def should_skip_event(event: EventDB) -> bool:
-    event_slug = event.slug.split('/')[-1]
+    decide_event_blacklist(event)
 
     return (
         event.state != ActivityState.COMPLETED or
-        any(re.search(pattern, event_slug) for pattern in BLACKLISTED_PATTERNS)
+        event.blacklisted is True
     )